@@ -0,0 +1,152 @@
+import heapq
+import random
+import numpy as np
+from collections import deque
+from simulator import Technology, MAGIC
+from HashPIM import HashPIM_dryRun, HashPIM_absorb, HashPIM_report
+
+
+def chipCosts(r: int, row: int = 1024, col: int = 1024, m: int = 72, n: int = 37, technology: Technology = MAGIC):
+    """
+    Computes the time of the phases of a crossbar slot (see HashPIM_chip) with dry runs of HashPIM
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param technology: the delay and energy of the gates
+    :return: a dict of the time (ns) of a Keccak-f permutation, of absorbing a block into the states in the crossbar
+        (see HashPIM_absorb), of loading the states and of reading them back (a write or read of w crossbar rows per
+        row partition), of the number of units, and of the system throughput of the README (Gbps, an r-bit block per
+        round of each unit)
+    """
+
+    w = 64
+
+    sim = HashPIM_dryRun(row, col, m, n, technology=technology)
+    units = (len(sim.row_partition_sizes) - 1) * (len(sim.col_partition_sizes) - 1)
+    readme = HashPIM_report(sim, r, units)['tput_system']
+
+    permutation = sim.time_ns
+    HashPIM_absorb(sim, m, n, r, None)
+
+    return {'permutation': permutation, 'absorb': sim.time_ns - permutation, 'load': sim.kr * w * technology.delay,
+            'read': sim.kr * w * technology.delay, 'units': units, 'readme': readme}
+
+
+def HashPIM_chip(r: int, arrival_rate: float, sizes: list, messages: int = 100000, N_XB: int = 1, row: int = 1024,
+                 col: int = 1024, m: int = 72, n: int = 37, technology: Technology = MAGIC, seed: int = 0):
+    """
+    Simulates a chip of N_XB crossbar arrays hashing a stream of messages, with a discrete-event model on the measured
+    latencies of HashPIM (see chipCosts). The messages arrive as a Poisson process, with seeded sizes, and wait in a
+    single queue (first come, first served). All the units of a crossbar perform the same operations, so each crossbar
+    runs slots back to back while it holds messages: the digests of the messages that completed in the previous slot
+    are read back, waiting messages are loaded as the initial states of the free units, the next block of each
+    multi-block message is absorbed, and Keccak-f is performed. A message holds its unit for a slot per block.
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param arrival_rate: the mean number of messages per second
+    :param sizes: the message size distribution, as (bytes, weight) pairs
+    :param messages: the number of simulated messages
+    :param N_XB: the number of crossbar arrays
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param technology: the delay and energy of the gates
+    :param seed: the seed of the arrivals and sizes
+    :return: a dict of the offered load and sustained throughput (Gbps of message bits, over the arrivals), the peak
+        throughput (every unit permuting a full r-bit block, without loads and reads) and the throughput of the README
+        (see chipCosts), the unit utilization (the fraction of the Keccak-f permutations of the units that permute a
+        message block, over the arrivals), the mean, p50, p99 and p99.9 latency (us, from arrival to read back) and the
+        mean queueing delay (us)
+    """
+
+    costs = chipCosts(r, row, col, m, n, technology)
+    units = costs['units']
+
+    rng = random.Random(seed)
+    lengths, weights = zip(*sizes)
+    arrivals = np.cumsum([rng.expovariate(arrival_rate) * 1e9 for _ in range(messages)])
+    message_bytes = rng.choices(lengths, weights, k=messages)
+
+    # The blocks of each message after the SHA-3 padding (at least one padding byte)
+    message_blocks = [length // (r // 8) + 1 for length in message_bytes]
+
+    queue = deque()
+    started = np.zeros(messages)
+    finished = np.zeros(messages)
+
+    # The message and remaining blocks of each unit of each crossbar, and the crossbars that are running slots
+    holding = [[None] * units for _ in range(N_XB)]
+    remaining = [[0] * units for _ in range(N_XB)]
+    running = [False] * N_XB
+
+    # The block permutations that end within the arrivals, and their share of the message bytes (the throughput and
+    # utilization are sustained over the arrivals)
+    permuted = 0
+    hashed = 0.0
+
+    # The events, as (time, order, crossbar) for the end of a slot, or (time, order, -1) for an arrival
+    events = [(arrivals[0], 0, -1)]
+    order = 1
+    arrived = 0
+
+    while events:
+        now, _, xb = heapq.heappop(events)
+
+        if xb < 0:
+            queue.append(arrived)
+            arrived += 1
+            if arrived < messages:
+                heapq.heappush(events, (arrivals[arrived], order, -1))
+                order += 1
+
+            # An idle crossbar starts a slot right away
+            xb = next((k for k in range(N_XB) if not running[k]), None)
+            if xb is None:
+                continue
+
+        duration = 0.0
+
+        # Read back the digests of the messages whose last block was permuted in the previous slot
+        done = [u for u in range(units) if holding[xb][u] is not None and remaining[xb][u] == 0]
+        if done:
+            duration += costs['read']
+            for u in done:
+                finished[holding[xb][u]] = now + duration
+                holding[xb][u] = None
+
+        # Load the waiting messages into the free units, and absorb the next block of the others
+        absorbing = any(holding[xb][u] is not None for u in range(units))
+        loading = False
+        for u in range(units):
+            if holding[xb][u] is None and queue:
+                holding[xb][u] = queue.popleft()
+                remaining[xb][u] = message_blocks[holding[xb][u]]
+                started[holding[xb][u]] = now + duration
+                loading = True
+        active = [u for u in range(units) if holding[xb][u] is not None]
+
+        if active:
+            duration += costs['load'] * loading + costs['absorb'] * absorbing + costs['permutation']
+            for u in active:
+                remaining[xb][u] -= 1
+            if now + duration <= arrivals[-1]:
+                permuted += len(active)
+                hashed += sum(message_bytes[holding[xb][u]] / message_blocks[holding[xb][u]] for u in active)
+
+        running[xb] = bool(active)
+        if active:
+            heapq.heappush(events, (now + duration, order, xb))
+            order += 1
+
+    latency = (finished - arrivals) / 1e3
+    window = arrivals[-1] - arrivals[0]
+
+    return {'offered': float(sum(message_bytes) * 8 / window),
+            'throughput': float(hashed * 8 / window),
+            'peak': r * units * N_XB / costs['permutation'], 'readme': costs['readme'] * N_XB,
+            'utilization': permuted * costs['permutation'] / (window * units * N_XB),
+            'latency': float(latency.mean()), 'p50': float(np.percentile(latency, 50)),
+            'p99': float(np.percentile(latency, 99)), 'p999': float(np.percentile(latency, 99.9)),
+            'queueing': float(((started - arrivals) / 1e3).mean())}
@@ -0,0 +1,142 @@
+import hashlib
+import random
+import time
+import numpy as np
+import torch
+from multiprocessing import Pool
+from simulator import MemoryBackend
+from HashPIM import HashPIM_record, HashPIM_sponge, HashPIM_layout, HashPIM_crossbar
+
+
+# The SHA-3 rate of each hash value size
+RATES = {224: 1152, 256: 1088, 384: 832, 512: 576}
+
+# The compiled trace of each (row, col, backend), recorded once per process
+TRACES = {}
+
+
+def edgeLengths(r: int, max_blocks: int):
+    """
+    The message lengths (in bytes) on the boundaries of the padding: the empty message, the bytes of the first lanes,
+    and the lengths around each block boundary (r/8-1 bytes is the longest message padded to a single block)
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param max_blocks: the maximal number of blocks of a message
+    :return: the sorted lengths
+    """
+
+    lengths = set(range(17))
+    for k in range(1, max_blocks + 1):
+        lengths.update(k * r // 8 + d for d in (-9, -8, -2, -1, 0, 1))
+    return sorted(length for length in lengths if 0 <= length < max_blocks * r // 8)
+
+
+def padBlocks(message: bytes, r: int, max_blocks: int, suffix: int = 0x06):
+    """
+    Pads a message by the SHA-3 padding rule (0x06 ... 0x80) to a whole number of r-bit blocks
+    :param message: the message
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param max_blocks: the maximal number of blocks of a message
+    :param suffix: the domain separation bits and the first padding bit (0x1F for SHAKE)
+    :return: the blocks (bit k of byte i at index 8*i+k), a (max_blocks, r) boolean array, and the number of blocks
+    """
+
+    num_blocks = len(message) // (r // 8) + 1
+    padded = bytearray(message) + bytearray(num_blocks * r // 8 - len(message))
+    padded[len(message)] ^= suffix
+    padded[-1] ^= 0x80
+
+    blocks = np.zeros((max_blocks, r), dtype=bool)
+    blocks[:num_blocks] = np.unpackbits(np.frombuffer(bytes(padded), dtype=np.uint8), bitorder='little').reshape(-1, r)
+    return blocks, num_blocks
+
+
+def HashPIM_conformanceBatch(digest: int, seed: int, row: int = 1024, col: int = 1024, max_blocks: int = 2,
+                             backend: MemoryBackend = MemoryBackend.PACKED, m: int = 72, n: int = 37):
+    """
+    Hashes a crossbar of seeded messages with HashPIM and checks every unit against hashlib. The first units hash the
+    edge-case lengths (see edgeLengths), and the others seeded random lengths of up to max_blocks blocks.
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param seed: the seed of the messages
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param max_blocks: the maximal number of blocks of a message
+    :param backend: the storage of the simulated memory
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :return: the digest, the seed, the number of hashes, the failures (as (unit, message length) pairs), and the
+        wall time in seconds
+    """
+
+    start = time.perf_counter()
+
+    r = RATES[digest]
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+    N_u = r_u * c_u
+
+    def crossbar():
+        return HashPIM_crossbar(row, col, m, n, torch.device('cpu'), backend=backend)
+
+    # The operations do not depend on the data, so the trace is recorded once (on a zero state) and replayed
+    if (row, col, backend) not in TRACES:
+        TRACES[(row, col, backend)] = HashPIM_record(crossbar(), m, n)
+    trace = TRACES[(row, col, backend)]
+
+    # The edge cases are rotated by the seed, so that consecutive batches of small crossbars cover all of them
+    edges = edgeLengths(r, max_blocks)
+    lengths = [edges[(seed * N_u + i) % len(edges)] for i in range(min(N_u, len(edges)))]
+
+    rng = random.Random(seed)
+    lengths += [rng.randrange(max_blocks * r // 8) for _ in range(N_u - len(lengths))]
+    messages = [rng.randbytes(length) for length in lengths]
+
+    blocks = np.zeros((N_u, max_blocks, r), dtype=bool)
+    num_blocks = np.zeros(N_u, dtype=np.int64)
+    for i, message in enumerate(messages):
+        blocks[i], num_blocks[i] = padBlocks(message, r, max_blocks)
+
+    sim = crossbar()
+    state = HashPIM_sponge(sim, m, n, r, torch.from_numpy(blocks).reshape(r_u, c_u, max_blocks, r),
+                           torch.from_numpy(num_blocks).reshape(r_u, c_u), trace)
+
+    hash_function = getattr(hashlib, f'sha3_{digest}')
+    out_in_bytes = np.packbits(state[..., :digest].reshape(N_u, digest).numpy(), axis=-1, bitorder='little')
+    hash_value = [bytes(it).hex() for it in out_in_bytes]
+    assert(len(hash_value) == N_u)
+
+    failures = [(i, len(message)) for i, message in enumerate(messages)
+                if hash_value[i] != hash_function(message).hexdigest()]
+
+    return digest, seed, N_u, failures, time.perf_counter() - start
+
+
+def HashPIM_conformance(digests: list = (224, 256, 384, 512), batches: int = 1, seed: int = 0, row: int = 1024,
+                        col: int = 1024, max_blocks: int = 2, backend: MemoryBackend = MemoryBackend.PACKED,
+                        processes: int = None):
+    """
+    Runs seeded crossbar batches of every SHA-3 variant (see HashPIM_conformanceBatch) in a pool of processes, and
+    summarizes them. A failing batch is reproduced by running HashPIM_conformanceBatch with its digest and seed.
+    :param digests: the SHA-3 hash value sizes
+    :param batches: the number of crossbar batches of each variant
+    :param seed: the seed of the first batch (batch k of each variant uses seed+k)
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param max_blocks: the maximal number of blocks of a message
+    :param backend: the storage of the simulated memory
+    :param processes: the number of processes (default: the number of CPUs)
+    :return: a dict of the (hashes, failures, time) of each variant, where the failures are (seed, unit, message
+        length) triples and the time is the total wall time of its batches, and the overall wall time in seconds
+    """
+
+    start = time.perf_counter()
+
+    with Pool(processes) as pool:
+        results = pool.starmap(HashPIM_conformanceBatch, [(digest, seed + k, row, col, max_blocks, backend)
+                                                          for digest in digests for k in range(batches)])
+
+    summary = {digest: {'hashes': 0, 'failures': [], 'time': 0.0} for digest in digests}
+    for digest, batch_seed, hashes, failures, wall_time in results:
+        summary[digest]['hashes'] += hashes
+        summary[digest]['failures'] += [(batch_seed, unit, length) for unit, length in failures]
+        summary[digest]['time'] += wall_time
+
+    return summary, time.perf_counter() - start
@@ -1,14 +1,54 @@
+import torch
 from Utilities import *
-from math import ceil, log2
+from simulator import MemoryBackend, Validation, Technology, MAGIC
+from Trace import CompiledTrace
+from Profiler import markStep
+from Scheduler import record, schedule
+from Optimizer import optimize
+from Keccak import StateChecker
+from Snapshot import SnapshotWriter
+from math import ceil, log2, gcd
+from functools import partial
+from enum import Enum
 
 
+# The rotation offsets of the lanes in the Rho step
+ROT = [0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14]
 
-def HashPIM(sim: Simulator, m: int, n: int):
+# The rate of each SHAKE extendable-output function, by its security strength
+SHAKE_RATES = {128: 1344, 256: 1088}
+
+# The rows of the last row partition (the log(w) bits of the rotation values (ROT) and a row of zeros), and the columns
+# of the last column partition (the Rnd round constants (RC) and a column of zeros), that hold the constants of the units
+ROT_ROWS = 7
+RC_COLS = 25
+
+
+class RhoStrategy(Enum):
+    """
+    Represents an implementation of the Rho step
+    """
+
+    # Each selector bit is copied from the ROT rows, and every lane is rotated by 2^i through a MUX on the selector
+    LOG_SHIFTER = 0
+
+    # The ROT table selects the lanes rotated by each 2^i through the column mask, and they are rotated in place
+    MASKED_SHIFTER = 1
+
+    # Each lane is rotated in place by its ROT offset, with the lane as the column mask
+    DIRECT = 2
+
+
+def HashPIM(sim: Simulator, m: int, n: int, trace: CompiledTrace = None, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER,
+            first_round: int = 0):
     """
     Performs the HashPIM algorithm of SHA-3
     :param sim: the simulation environment
     :param m: the number of rows in each SHA-3 unit
     :param n: the number of columns in each SHA-3 unit
+    :param trace: a compiled trace of the 24 rounds (see HashPIM_record), replayed instead of issuing the operations
+    :param rho: the implementation of the Rho step
+    :param first_round: the round to start at (e.g., to resume from a snapshot, see HashPIM_resume)
     """
 
     b = 1600
@@ -41,44 +81,576 @@ def HashPIM(sim: Simulator, m: int, n: int):
     RC[22] = 0x0000000080000001
     RC[23] = 0x8000000080008008
 
-    ROT = [0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14]
+    # The last row/column partitions hold the constants, and are not part of any SHA-3 unit
+    sim.kc = len(sim.col_partition_starts) - 1
+    sim.kr = len(sim.row_partition_starts) - 1
+
+    if not sim.dry_run:
+        # The rows of the lanes in the row partitions of the units, and the columns of the lanes in their column partitions
+        unit_rows = (torch.tensor(sim.row_partition_starts[:sim.kr], device=sim.device)[:, None] +
+                     torch.arange(w, device=sim.device)).flatten()
+        unit_cols = (torch.tensor(sim.col_partition_starts[:sim.kc], device=sim.device)[:, None] +
+                     torch.arange(b // w, device=sim.device)).flatten()
+
+        # Bit j of RC[ir] is in row j of column ir, and bit i of ROT[j] is in row i of column j
+        rc_bits = torch.tensor([[(RC[ir] >> j) & 1 for ir in range(Rnd)] for j in range(w)], dtype=torch.bool, device=sim.device)
+        rot_bits = torch.tensor([[(ROT[j] >> i) & 1 for j in range(b // w)] for i in range(ceil(log2(w)))], dtype=torch.bool, device=sim.device)
+
+        for memory in sim.activeMemories():
+            cells = memory if sim.backend == MemoryBackend.BOOL else memory.unpack()
+
+            # Storing the round constants (RC) used in Iota step, in the crossbar array
+            # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
+            cells[..., unit_rows[:, None], sim.col_partition_starts[sim.kc] + torch.arange(Rnd, device=sim.device)] = rc_bits.repeat(sim.kr, 1)
+
+            # Storing the rotation values (ROT) used in Rho step, in the crossbar array
+            # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
+            cells[..., sim.row_partition_starts[sim.kr] + torch.arange(ceil(log2(w)), device=sim.device)[:, None], unit_cols] = rot_bits.repeat(1, sim.kc)
+
+            # Storing zeros in the last column and the last row of the crossbar array
+            # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
+            cells[..., unit_rows, sim.c-1] = False
+            cells[..., sim.r-1, unit_cols] = False
+
+            if sim.backend == MemoryBackend.PACKED:
+                memory.pack(cells)
+
+    if trace is not None:
+        assert(first_round == 0)
+        trace.replay(sim)
+        return
+
+    sim.beginProgram(('HashPIM', m, n, rho))
+    if sim.dry_run:
+        assert(first_round == 0)
+        # The rounds perform the same operations (other than the round constant column), so a single round is counted
+        latency, energy, time_ns, energy_fJ = sim.latency, sim.energy, sim.time_ns, sim.energy_fJ
+        HashPIM_f(sim, m, n, b, w, Rnd, 0, rho)
+        sim.charge((sim.latency - latency) * (Rnd - 1), (sim.energy - energy) * (Rnd - 1),
+                   (sim.time_ns - time_ns) * (Rnd - 1), (sim.energy_fJ - energy_fJ) * (Rnd - 1))
+    else:
+        for ir in range(first_round, Rnd):
+            HashPIM_f(sim, m, n, b, w, Rnd, ir, rho)
+    sim.endProgram()
+
+
+def HashPIM_record(sim: Simulator, m: int, n: int, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Performs the HashPIM algorithm of SHA-3 while recording it, and compiles the recording into a trace.
+    The operations do not depend on the data, so the trace can be replayed on any crossbar with the same geometry.
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param rho: the implementation of the Rho step
+    :return: the compiled trace of the 24 rounds
+    """
 
-    sim.kc = sim.kc - 1
-    sim.kr = sim.kr - 1
+    sim.trace = []
+    try:
+        HashPIM(sim, m, n, rho=rho)
+        return CompiledTrace(sim, sim.trace)
+    finally:
+        sim.trace = None
 
-    # Storing the round constants (RC) used in Iota step, in the crossbar array
-    # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
-    for j in range(w):
-        for ir in range(Rnd):
-            for rp in range(sim.kr):
-                sim.memory[sim.relToAbsRow(rp, j), sim.col_partition_starts[sim.kc] + ir] = int(format((RC[ir]),'064b')[w-j-1])
 
-    # Storing the rotation values (ROT) used in Rho step, in the crossbar array 
-    # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
-    for j in range(b // w):
-        for cp in range(sim.kc):
-            for i in range(ceil(log2(w))):
-                sim.memory[sim.row_partition_starts[sim.kr] + i, sim.relToAbsCol(cp, j)] = int(format((ROT[j]),'06b')[ceil(log2(w))-i-1])
+def HashPIM_schedule(sim: Simulator, m: int, n: int):
+    """
+    Performs the HashPIM algorithm of SHA-3 while recording it, and packs the recording into fewer cycles
+    (see Scheduler.schedule). The operations do not depend on the data, so the optimized program can be replayed
+    on any crossbar with the same geometry.
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :return: the compiled trace of the optimized program, and the cycles saved in each step
+    """
+
+    parallelOps, steps = record(sim, partial(HashPIM, m=m, n=n))
+    program, report = schedule(sim, parallelOps, steps)
+
+    for parallelOp in program:
+        sim.checkCollisions(parallelOp)
+
+    return CompiledTrace(sim, program), report
+
+
+def HashPIM_optimize(sim: Simulator, m: int, n: int):
+    """
+    Performs the HashPIM algorithm of SHA-3 while recording it, and removes the redundant initializations of the
+    recording (see Optimizer.optimize). The optimized program is verified by replaying it from the initial memory,
+    against the memory after the recorded run.
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :return: the compiled trace of the optimized program, and the cycles saved in each step
+    """
+
+    if not sim.dry_run:
+        initial = sim.memory.clone() if sim.backend == MemoryBackend.BOOL else sim.memory.unpack()
+
+    parallelOps, steps = record(sim, partial(HashPIM, m=m, n=n))
+    program, report = optimize(sim, parallelOps, steps)
+    trace = CompiledTrace(sim, program)
+
+    if not sim.dry_run:
+        replay_sim = Simulator(sim.row_partition_sizes, sim.col_partition_sizes, sim.device, sim.backend,
+                               batch=sim.batch, technology=sim.technology)
+        if sim.backend == MemoryBackend.BOOL:
+            replay_sim.memory = initial
+        else:
+            replay_sim.memory.pack(initial)
+        HashPIM(replay_sim, m, n, trace)
+
+        if sim.backend == MemoryBackend.BOOL:
+            assert(torch.equal(replay_sim.memory, sim.memory))
+        else:
+            assert(torch.equal(replay_sim.memory.unpack(), sim.memory.unpack()))
+
+    return trace, report
+
+
+def HashPIM_check(sim: Simulator, m: int, n: int, strict: bool = True, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Performs the HashPIM algorithm of SHA-3 while diffing the states of all the units against the reference Keccak-f
+    after every step of every round (see Keccak.StateChecker)
+    :param sim: the simulation environment (with the states loaded)
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param strict: whether the first mismatch fails an assertion (otherwise, all the mismatches are collected)
+    :param rho: the implementation of the Rho step
+    :return: the mismatching steps, as dicts of the round, step, mismatching units and their mismatching lanes
+    """
+
+    checker = StateChecker(sim, strict)
+    sim.observers.append(checker)
+    try:
+        HashPIM(sim, m, n, rho=rho)
+        return checker.mismatches
+    finally:
+        sim.observers.remove(checker)
+
+
+def HashPIM_snapshot(sim: Simulator, m: int, n: int, path: str, steps: bool = False, first_round: int = 0,
+                     rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Performs the HashPIM algorithm of SHA-3 while writing a snapshot of the crossbar after every round, or after every
+    step (see Snapshot.SnapshotWriter)
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param path: the snapshot file of each position, formatted with the round and step (e.g., 'run_{round:02d}.snap')
+    :param steps: whether to write a snapshot after each step, rather than after each round
+    :param first_round: the round to start at
+    :param rho: the implementation of the Rho step
+    :return: the written snapshot files, in order
+    """
+
+    writer = SnapshotWriter(sim, path, steps, first_round)
+    sim.observers.append(writer)
+    try:
+        HashPIM(sim, m, n, rho=rho, first_round=first_round)
+        return writer.written
+    finally:
+        sim.observers.remove(writer)
+
+
+def HashPIM_resume(path: str, m: int, n: int, device: torch.device, backend: MemoryBackend = MemoryBackend.BOOL,
+                   rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Resumes the HashPIM algorithm of SHA-3 from a snapshot written at the end of a round (see HashPIM_snapshot), on a
+    new simulator with the layout, memory and counters of the snapshot
+    :param path: the snapshot file
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param device: The device (e.g., CPU, GPU) to utilize
+    :param backend: The storage of the memory
+    :param rho: the implementation of the Rho step (that of the snapshot run)
+    :return: the simulation environment, after the last round
+    """
+
+    sim, position = Simulator.fromSnapshot(path, device, backend)
+
+    # The steps of a round are not resumable on their own, so a run resumes at the round following the snapshot
+    assert(position['step'] == 'Iota')
+    HashPIM(sim, m, n, rho=rho, first_round=position['round'] + 1)
+    return sim
+
+
+def HashPIM_sharded(sim: Simulator, m: int, n: int, row_groups: int, col_groups: int, processes: int = None,
+                    rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Performs the HashPIM algorithm of SHA-3 on groups of SHA-3 units in parallel worker processes
+    (see Simulator.performSharded), each group with its own copy of the RC columns and ROT rows.
+    The groups perform the same operations other than the copies that are serialized per partition (see
+    HashPIM_serialCycles), which span the partitions of the whole crossbar: the latency of the slowest group is merged
+    with the serialized cycles of the partitions of the other groups.
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param row_groups: the number of groups of unit rows
+    :param col_groups: the number of groups of unit columns
+    :param processes: the number of worker processes (default: the number of CPUs)
+    :param rho: the implementation of the Rho step
+    """
+
+    sim.kc = len(sim.col_partition_starts) - 1
+    sim.kr = len(sim.row_partition_starts) - 1
+
+    Rnd = 24
+
+    costs = sim.performSharded(partial(HashPIM, m=m, n=n, rho=rho), row_groups, col_groups, processes=processes)
+
+    serial = [Rnd * HashPIM_serialCycles(len(rows), len(cols), rho) for rows, cols in sim.tileGroups(row_groups, col_groups)]
+    bases = {cost[0] - cycles for cost, cycles in zip(costs, serial)}
+    if len(bases) != 1:
+        raise RuntimeError(f'The groups differ by more than their serialized copies ({sorted(bases)} cycles)')
+
+    # Each serialized copy is a cycle of a single OR gate
+    cycles = Rnd * HashPIM_serialCycles(sim.kr, sim.kc, rho) - max(serial)
+    sim.charge(cycles, 0, cycles * sim.technology.gateDelay(GateType.OR), 0)
+
+
+def HashPIM_sponge(sim: Simulator, m: int, n: int, r: int, blocks: torch.Tensor, num_blocks: torch.Tensor,
+                   trace: CompiledTrace = None):
+    """
+    Performs the absorbing phase of the SHA-3 sponge for messages of several r-bit blocks, with a message per unit.
+    The first block is loaded as the initial state, and each following block is written to the unit intermediates and
+    XORed into the state in the crossbar (see HashPIM_absorb) before the next Keccak-f permutation.
+    Units with fewer blocks are masked: they receive zero blocks, and their state is captured after their last permutation,
+    with a read of the crossbar (a cycle per crossbar row, as in HashPIM_squeeze) when other units have blocks left.
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param blocks: the padded message blocks of each unit, a (..., r_u, c_u, max blocks, r) tensor
+    :param num_blocks: the number of blocks of each unit, a (..., r_u, c_u) tensor
+    :param trace: a compiled trace of the 24 rounds (see HashPIM_record), replayed for each permutation
+    :return: the Keccak-f state of each unit after its last block, a (..., r_u, c_u, b) tensor
+    """
+
+    b = 1600
+    w = 64
+
+    # The initial state is the first block followed by the zero capacity
+    state = torch.zeros(blocks.shape[:-2] + (b,), dtype=torch.bool, device=sim.device)
+    state[..., :r] = blocks[..., 0, :]
+    sim.loadStates(state, w=w)
+
+    final = state
+    for k in range(blocks.shape[-2]):
+        if k > 0:
+            HashPIM_absorb(sim, m, n, r, blocks[..., k, :] & (num_blocks > k)[..., None])
+
+        HashPIM(sim, m, n, trace)
+
+        # Capture the state of the units that absorbed their last block while the others continue
+        if k < blocks.shape[-2] - 1 and (num_blocks == k + 1).any():
+            state = sim.readStates(blocks.shape[-4], blocks.shape[-3], lanes=b // w, w=w)
+            sim.charge(sim.kr * w, 0)
+            final = torch.where((num_blocks == k + 1)[..., None], state, final)
+
+    # The states of the units that absorbed their last block in the last permutation are read out with the hash values
+    state = sim.readStates(blocks.shape[-4], blocks.shape[-3], lanes=b // w, w=w)
+    return torch.where((num_blocks == blocks.shape[-2])[..., None], state, final)
+
+
+def HashPIM_absorb(sim: Simulator, m: int, n: int, r: int, block: torch.Tensor):
+    """
+    XORs an r-bit block into the Keccak-f state of each unit. The block lanes are written to the column intermediates
+    (one crossbar row per cycle), and each lane is XORed into the state lane in parallel for all the units.
+    :param sim: the simulation environment (after HashPIM, which sets up the partitions and constants)
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param block: the block of each unit, a (..., r_u, c_u, r) tensor (unused in a dry run)
+    """
+
+    b = 1600
+    w = 64
+
+    col_intermediates = list(range(b // w, n))
+    col_mask = [j + sim.row_partition_starts[rp] for rp in range(sim.kr) for j in range(w)]
+
+    # Block lanes are staged in all the column intermediates but two: the XOR output and a zero column
+    stage = col_intermediates[:-2]
+    temp = col_intermediates[-2]
+    zero = col_intermediates[-1]
+
+    INIT0(sim, [zero], GateDirection.IN_ROW, col_mask)
+
+    for first in range(0, r // w, len(stage)):
+        lanes = list(range(first, min(first + len(stage), r // w)))
+
+        # Write the block lanes, one row of the crossbar array per cycle
+        if not sim.dry_run:
+            sim.loadStates(block[..., first * w:(first + len(lanes)) * w], column=stage[0], w=w)
+        sim.charge(sim.kr * w, sim.kr * w * sim.kc * len(lanes))
+
+        # A[x][y] = A[x][y] ^ block[x][y]
+        for lane, staged in zip(lanes, stage):
+            INIT1(sim, [temp], GateDirection.IN_ROW, col_mask)
+            XOR(sim, lane, staged, temp, GateDirection.IN_ROW, col_mask)
+            INIT1(sim, [lane], GateDirection.IN_ROW, col_mask)
+            OR(sim, temp, zero, lane, GateDirection.IN_ROW, col_mask)
+
 
-    # Storing zeros in the last column of the crossbar array
-    # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
-    for j in range(w):
-        for rp in range(sim.kr):
-            sim.memory[sim.relToAbsRow(rp, j), sim.c-1] = 0
+def HashPIM_squeeze(sim: Simulator, m: int, n: int, r: int, output_bits: int, trace: CompiledTrace = None):
+    """
+    Performs the squeezing phase of the sponge for an extendable-output function, on the states in the crossbar after
+    the absorbing phase. The first r bits of the state of every unit are read out, and Keccak-f is performed again in
+    the crossbar (back to back, the states never leave it) until output_bits bits are read. Each read takes a cycle per
+    crossbar row of the rate lanes (w rows of each row partition, for all the units at once), and no switchings.
+    :param sim: the simulation environment (after the absorbing phase, see HashPIM_sponge)
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param r: the rate of the sponge
+    :param output_bits: the number of output bits of each unit
+    :param trace: a compiled trace of the 24 rounds (see HashPIM_record), replayed for each permutation
+    :return: the output of each unit, a (..., r_u, c_u, output_bits) tensor
+    """
+
+    w = 64
+
+    outputs = []
+    for k in range(ceil(output_bits / r)):
+        if k > 0:
+            HashPIM(sim, m, n, trace)
 
-    # Storing zeros in the last row of the crossbar array
-    # Note: Performed one time for the crossbar array, hence doesn't count in the latency and energy evaluation
-    for j in range(b // w):
-        for cp in range(sim.kc):
-            sim.memory[sim.r-1, sim.relToAbsCol(cp, j)] = 0
+        outputs.append(sim.readStates(lanes=r // w, w=w))
+        sim.charge(sim.kr * w, 0)
 
+    return torch.cat(outputs, dim=-1)[..., :output_bits]
+
+
+def HashPIM_shake(sim: Simulator, m: int, n: int, d: int, blocks: torch.Tensor, num_blocks: torch.Tensor,
+                  output_bits: int, trace: CompiledTrace = None):
+    """
+    Performs SHAKE128/SHAKE256 with a message per unit: the padded blocks are absorbed (see HashPIM_sponge), and
+    output_bits bits are squeezed out of each unit (see HashPIM_squeeze)
+    :param sim: the simulation environment
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param d: the security strength = {128,256}
+    :param blocks: the message blocks of each unit, padded by the SHAKE padding rule, a (..., r_u, c_u, max blocks, r) tensor
+    :param num_blocks: the number of blocks of each unit, a (..., r_u, c_u) tensor
+    :param output_bits: the number of output bits of each unit
+    :param trace: a compiled trace of the 24 rounds (see HashPIM_record), replayed for each permutation
+    :return: the output of each unit, a (..., r_u, c_u, output_bits) tensor, and the cycles of the squeezing phase
+    """
+
+    b = 1600
+    w = 64
+
+    r = SHAKE_RATES[d]
+
+    state = HashPIM_sponge(sim, m, n, r, blocks, num_blocks, trace)
+
+    # The units with fewer blocks kept permuting masked blocks, so their states (read out by HashPIM_sponge, a charged
+    # read) are written back before squeezing, one row of the crossbar array per cycle (as the block lanes in HashPIM_absorb)
+    if not (num_blocks == blocks.shape[-2]).all():
+        sim.loadStates(state, w=w)
+        sim.charge(sim.kr * w, sim.kr * w * sim.kc * (b // w))
+
+    latency = sim.latency
+    output = HashPIM_squeeze(sim, m, n, r, output_bits, trace)
+    return output, sim.latency - latency
+
+
+def HashPIM_layout(row: int, col: int, m: int = 72, n: int = 37):
+    """
+    The number of SHA-3 units that fit in a crossbar array alongside the ROT rows and RC columns
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :return: the number of SHA-3 units vertically (r_u) and horizontally (c_u)
+    """
+    return (row - ROT_ROWS) // m, (col - RC_COLS) // n
 
-    for ir in range(Rnd):
-        HashPIM_f(sim, m, n, b, w, Rnd, ir)
 
+def HashPIM_crossbar(row: int, col: int, m: int, n: int, device: torch.device, simulator: type = Simulator, **kwargs):
+    """
+    Constructs a crossbar-level simulation environment: a grid of r_u x c_u SHA-3 units (see HashPIM_layout), followed
+    by a row partition of the ROT rows and a column partition of the RC columns
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param device: the device (e.g., CPU, GPU) to utilize
+    :param simulator: the simulator class (e.g., MultiCrossbarSimulator)
+    :param kwargs: the other parameters of the simulator (e.g., the backend)
+    :return: the simulation environment
+    """
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+    return simulator([m] * r_u + [row - m * r_u], [n] * c_u + [col - n * c_u], device=device, **kwargs)
+
+
+def HashPIM_units(batch: int, m: int, n: int, device: torch.device, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Constructs a unit-level simulation environment: a batch of independent SHA-3 units, each a crossbar with a single
+    unit and its own rotation values (ROT) rows and round constants (RC) column. All the units of a crossbar perform the
+    same operations on their own tile, so running HashPIM once on this environment hashes a message in every unit.
+    :param batch: the number of SHA-3 units
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param device: the device (e.g., CPU, GPU) to utilize
+    :param backend: the storage of the simulated memory
+    :return: the simulation environment, with memory of shape (batch, m+log(w)+2, n+Rnd+2)
+    """
+
+    return Simulator([m, ROT_ROWS], [n, RC_COLS], device=device, backend=backend, batch=batch)
+
+
+def HashPIM_scale(sim: Simulator, r_u: int, c_u: int, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Scales the counters of a unit-level simulation (see HashPIM_units) to a crossbar of r_u x c_u SHA-3 units.
+    The switchings scale with the number of units, and the latency grows only by the operations that are serialized
+    across partitions (see HashPIM_serialCycles).
+    :param sim: the unit-level simulation environment, after running HashPIM
+    :param r_u: the number of SHA-3 units vertically in the crossbar array
+    :param c_u: the number of SHA-3 units horizontally in the crossbar array
+    :param rho: the implementation of the Rho step (that of the unit-level run)
+    :return: the (latency, energy) of the crossbar array
+    """
+
+    Rnd = 24
+
+    latency = sim.latency + Rnd * (HashPIM_serialCycles(r_u, c_u, rho) - HashPIM_serialCycles(1, 1, rho))
+    energy = sim.energy * r_u * c_u
+
+    return latency, energy
+
+
+def HashPIM_serialCycles(r_u: int, c_u: int, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Computes the cycles of a round that are serialized across partitions: the Iota round constant copy (a cycle per
+    column partition) and, in the LOG_SHIFTER Rho step, the selector bit copy (a cycle per row partition for each of
+    the log(w) selector bits; the other strategies select the lanes through their column masks)
+    :param r_u: the number of SHA-3 units vertically
+    :param c_u: the number of SHA-3 units horizontally
+    :param rho: the implementation of the Rho step
+    :return: the number of serialized cycles of a round
+    """
+
+    w = 64
+
+    return (ceil(log2(w)) * r_u if rho == RhoStrategy.LOG_SHIFTER else 0) + c_u
 
 
-def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int):
+def HashPIM_cost(row: int, col: int, m: int = 72, n: int = 37, r_u: int = None, c_u: int = None):
+    """
+    Computes the latency and energy of HashPIM for a crossbar geometry, with a dry run (see HashPIM_dryRun)
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param r_u: the number of SHA-3 units vertically (default: floor((row-log(w)-1)/m))
+    :param c_u: the number of SHA-3 units horizontally (default: floor((col-Rnd-1)/n))
+    :return: the (latency, energy) of the crossbar array for the 24 rounds
+    """
+
+    sim = HashPIM_dryRun(row, col, m, n, r_u, c_u)
+
+    return sim.latency, sim.energy
+
+
+def HashPIM_dryRun(row: int, col: int, m: int = 72, n: int = 37, r_u: int = None, c_u: int = None,
+                   technology: Technology = MAGIC, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Runs HashPIM on a crossbar geometry without simulating the memory
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param r_u: the number of SHA-3 units vertically (default: floor((row-log(w)-1)/m))
+    :param c_u: the number of SHA-3 units horizontally (default: floor((col-Rnd-1)/n))
+    :param technology: the delay and energy of the gates
+    :param rho: the implementation of the Rho step
+    :return: the simulation environment, with the counters of the 24 rounds
+    """
+
+    w = 64
+    Rnd = 24
+
+    layout = HashPIM_layout(row, col, m, n)
+    r_u = r_u if r_u is not None else layout[0]
+    c_u = c_u if c_u is not None else layout[1]
+    assert(r_u > 0 and c_u > 0 and row - m * r_u > ceil(log2(w)) and col - n * c_u > Rnd)
+
+    sim = Simulator([m] * r_u + [row - m * r_u], [n] * c_u + [col - n * c_u], device=torch.device('cpu'),
+                    validate=Validation.OFF, dry_run=True, technology=technology)
+    HashPIM(sim, m, n, rho=rho)
+
+    return sim
+
+
+def HashPIM_report(sim: Simulator, r: int, units: int = None, N_XB: int = 1):
+    """
+    Evaluates a crossbar array that ran the 24 rounds of HashPIM with the formulas of the README, for a single round:
+    Tput_Unit = r / Latency_Round, Tput_System = Tput_Unit * U_XB * N_XB, Power_System = Tput_System * Energy_Unit / r
+    :param sim: the simulation environment, after running HashPIM
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param units: the number of SHA-3 units in the crossbar array (default: all the partitions but the last)
+    :param N_XB: the number of crossbar arrays
+    :return: a dict of the cycles, switchings (per unit), time (ns), energy (fJ, per unit) and f (MHz) of a round,
+        and of tput_unit and tput_system (Gbps), power_system (W), tput_power (Gbps/W) and tput_area (bps/F^2,
+        for memristors of 4F^2)
+    """
+
+    Rnd = 24
+
+    units = units if units is not None else (len(sim.row_partition_sizes) - 1) * (len(sim.col_partition_sizes) - 1)
+
+    time_ns = sim.time_ns / Rnd
+    energy_fJ = sim.energy_fJ / (Rnd * units)
+
+    tput_unit = r / time_ns
+    tput_system = tput_unit * units * N_XB
+    power_system = tput_system * 1e9 * energy_fJ * 1e-15 / r
+
+    return {'cycles': sim.latency // Rnd, 'switchings': sim.energy // (Rnd * units), 'time': time_ns,
+            'energy': energy_fJ, 'f': sim.latency / sim.time_ns * 1e3, 'tput_unit': tput_unit,
+            'tput_system': tput_system, 'power_system': power_system, 'tput_power': tput_system / power_system,
+            'tput_area': tput_system * 1e9 / (4 * sim.r * sim.c * N_XB)}
+
+
+def HashPIM_rotate(sim: Simulator, w: int, shift: int, temps: list, zero: int, mask: list):
+    """
+    Rotates the lanes of the masked columns in place, moving row k of each lane to row (k+shift)%w. The rotation splits
+    into gcd(shift, w) disjoint chains of rows, each shifted along by one row copy per row. The first row of up to
+    len(temps) chains is saved at a time, so that the rows freed at the start and end of the chains are initialized together.
+    :param sim: the simulation environment
+    :param w: the Keccak-f lane size
+    :param shift: the rotation offset
+    :param temps: the intra-partition intermediate rows (initialized to 1, and initialized to 1 again on return)
+    :param zero: an intra-partition row of zeros
+    :param mask: the columns of the rotated lanes
+    """
+
+    g = gcd(shift, w)
+    chains = [[(a - t * shift) % w for t in range(w // g)] for a in range(g)]
+
+    for k in range(0, g, len(temps)):
+        group = chains[k:k + len(temps)]
+
+        for chain, temp in zip(group, temps):
+            OR(sim, chain[0], zero, temp, GateDirection.IN_COLUMN, mask)
+        INIT1(sim, [chain[0] for chain in group], GateDirection.IN_COLUMN, mask)
+
+        # Row chain[t] receives the row that precedes it by shift, chain[t+1]
+        for chain in group:
+            for t in range(len(chain) - 1):
+                if t > 0:
+                    INIT1(sim, [chain[t]], GateDirection.IN_COLUMN, mask)
+                OR(sim, chain[t + 1], zero, chain[t], GateDirection.IN_COLUMN, mask)
+
+        INIT1(sim, [chain[-1] for chain in group], GateDirection.IN_COLUMN, mask)
+        for chain, temp in zip(group, temps):
+            OR(sim, temp, zero, chain[-1], GateDirection.IN_COLUMN, mask)
+        INIT1(sim, temps[:len(group)], GateDirection.IN_COLUMN, mask)
+
+
+def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int,
+              rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
     """
     Performs the HashPIM algorithm of SHA-3
     :param sim: the simulation environment
@@ -88,6 +660,7 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
     :param w: the Keccak-f lane size
     :param Rnd: Keccak-f total rounds
     :param ir: the Keccak-f round iterator
+    :param rho: the implementation of the Rho step
     """
     
     x = 5
@@ -99,9 +672,9 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
     col_intermediates = list(range(b // w, n))
     row_intermediates = list(range(w, m))
 
-    col_mask  = sum([[j + sim.row_partition_starts[rp] for j in range(w)] for rp in range(sim.kr)], [])
-    row_mask1 = sum([[j + sim.col_partition_starts[cp] for j in range(b // w)] for cp in range(sim.kc)], [])
-    row_mask2 = sum([[j + col_intermediates[5] + sim.col_partition_starts[cp] for j in range(5)] for cp in range(sim.kc)], [])
+    col_mask  = [j + sim.row_partition_starts[rp] for rp in range(sim.kr) for j in range(w)]
+    row_mask1 = [j + sim.col_partition_starts[cp] for cp in range(sim.kc) for j in range(b // w)]
+    row_mask2 = [j + col_intermediates[5] + sim.col_partition_starts[cp] for cp in range(sim.kc) for j in range(5)]
 
 
     '''
@@ -112,6 +685,8 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
         A[x][y] = A[x][y] ^ D[x]
     '''
 
+    markStep(sim, 'Theta')
+
     A = [[i + 5 * j for j in range(y)] for i in range(x)]
 
     # Intermediate initialization
@@ -165,58 +740,78 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
         A[x][y] = A[x][y] <<< rot[x][y]
     '''
 
-    INIT0(sim, [row_intermediates[0]], GateDirection.IN_COLUMN, row_mask1)
+    markStep(sim, 'Rho')
+
+    if rho == RhoStrategy.LOG_SHIFTER:
+        INIT0(sim, [row_intermediates[0]], GateDirection.IN_COLUMN, row_mask1)
 
-    # Serially coping each selector bit, out of log(64)=6 bits, from the rotation map (ROT) to each unit
-    for i in range(ceil(log2(w))):
-        INIT1(sim, row_intermediates[1:5], GateDirection.IN_COLUMN, row_mask1)
-        for rp in range(sim.kr):
-            sim.perform(ParallelOperation([Operation(GateType.OR, GateDirection.IN_COLUMN,
-                            [rot[i], sim.r-1], [sim.relToAbsRow(rp, row_intermediates[1])], row_mask1)]))
+        # Serially coping each selector bit, out of log(64)=6 bits, from the rotation map (ROT) to each unit
+        for i in range(ceil(log2(w))):
+            INIT1(sim, row_intermediates[1:5], GateDirection.IN_COLUMN, row_mask1)
+            for rp in range(sim.kr):
+                sim.perform(ParallelOperation([Operation(GateType.OR, GateDirection.IN_COLUMN,
+                                [rot[i], sim.r-1], [sim.relToAbsRow(rp, row_intermediates[1])], row_mask1)]))
             
-        # Storing a copy of the inverted selector bit
-        NOT(sim, row_intermediates[1], row_intermediates[2], GateDirection.IN_COLUMN, row_mask1)
-
-        # For bit l in lane with corresponding x,y: 
-        # d1 = l[x][y]
-        # d0 = l[x][y] <<< 2 ** ROT_i[x]
-        d1 = sim.row_partition_starts[0]
-        d0 = (d1 + 2 ** i) % w
-
-        INIT1(sim, [row_intermediates[4]], GateDirection.IN_COLUMN, row_mask1)
-        OR(sim, d1, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
-
-        is_rot = [False]*w
-
-        # Implementing MUX operation in parallel for each 64-bit lane:
-        # MUX(d0, d1, sel) = NOR(NOR(d0, sel), NOR(d1, NOT(sel)))
-        for j in range(w):
-            if is_rot[d0] is True:
-                d0 += 1
-                d1 += 1
-                INIT1(sim, row_intermediates[3:5], GateDirection.IN_COLUMN, row_mask1)
-                OR(sim, d1, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
+            # Storing a copy of the inverted selector bit
+            NOT(sim, row_intermediates[1], row_intermediates[2], GateDirection.IN_COLUMN, row_mask1)
+
+            # For bit l in lane with corresponding x,y: 
+            # d1 = l[x][y]
+            # d0 = l[x][y] <<< 2 ** ROT_i[x]
+            d1 = sim.row_partition_starts[0]
+            d0 = (d1 + 2 ** i) % w
+
+            INIT1(sim, [row_intermediates[4]], GateDirection.IN_COLUMN, row_mask1)
+            OR(sim, d1, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
+
+            is_rot = [False]*w
+
+            # Implementing MUX operation in parallel for each 64-bit lane:
+            # MUX(d0, d1, sel) = NOR(NOR(d0, sel), NOR(d1, NOT(sel)))
+            for j in range(w):
+                if is_rot[d0] is True:
+                    d0 += 1
+                    d1 += 1
+                    INIT1(sim, row_intermediates[3:5], GateDirection.IN_COLUMN, row_mask1)
+                    OR(sim, d1, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
             
-            INIT1(sim, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
+                INIT1(sim, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
+
+                if (j % 2 == 0):
+                    INIT1(sim, [row_intermediates[3]], GateDirection.IN_COLUMN, row_mask1)
+                    OR(sim, d0, row_intermediates[0], row_intermediates[3], GateDirection.IN_COLUMN, row_mask1)
+                    INIT1(sim, [d0], GateDirection.IN_COLUMN, row_mask1)
+                    MUX2(sim, row_intermediates[3], row_intermediates[4], row_intermediates[1], row_intermediates[2], 
+                            d0, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
 
-            if (j % 2 == 0):
-                INIT1(sim, [row_intermediates[3]], GateDirection.IN_COLUMN, row_mask1)
-                OR(sim, d0, row_intermediates[0], row_intermediates[3], GateDirection.IN_COLUMN, row_mask1)
-                INIT1(sim, [d0], GateDirection.IN_COLUMN, row_mask1)
-                MUX2(sim, row_intermediates[3], row_intermediates[4], row_intermediates[1], row_intermediates[2], 
-                        d0, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
+                else:
+                    INIT1(sim, [row_intermediates[4]], GateDirection.IN_COLUMN, row_mask1)
+                    OR(sim, d0, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
+                    INIT1(sim, [d0], GateDirection.IN_COLUMN, row_mask1)
+                    MUX2(sim, row_intermediates[4], row_intermediates[3], row_intermediates[1], row_intermediates[2], 
+                            d0, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
 
-            else:
-                INIT1(sim, [row_intermediates[4]], GateDirection.IN_COLUMN, row_mask1)
-                OR(sim, d0, row_intermediates[0], row_intermediates[4], GateDirection.IN_COLUMN, row_mask1)
-                INIT1(sim, [d0], GateDirection.IN_COLUMN, row_mask1)
-                MUX2(sim, row_intermediates[4], row_intermediates[3], row_intermediates[1], row_intermediates[2], 
-                        d0, row_intermediates[5:7], GateDirection.IN_COLUMN, row_mask1)
+                is_rot[d0] = True
 
-            is_rot[d0] = True
+                d1 = (d1 + 2 ** i) % w
+                d0 = (d0 + 2 ** i) % w
 
-            d1 = (d1 + 2 ** i) % w
-            d0 = (d0 + 2 ** i) % w
+    else:
+        INIT0(sim, [row_intermediates[0]], GateDirection.IN_COLUMN, row_mask1)
+        INIT1(sim, row_intermediates[1:], GateDirection.IN_COLUMN, row_mask1)
+
+        if rho == RhoStrategy.MASKED_SHIFTER:
+            # Rotating by 2 ** i only the lanes whose rotation offset (ROT) has bit i set
+            for i in range(ceil(log2(w))):
+                mask = [j + sim.col_partition_starts[cp] for cp in range(sim.kc) for j in range(b // w) if ROT[j] >> i & 1]
+                HashPIM_rotate(sim, w, 2 ** i, row_intermediates[1:], row_intermediates[0], mask)
+
+        else:
+            # Rotating each lane by its rotation offset (ROT), apart from A[0][0]
+            for j in range(b // w):
+                if ROT[j] > 0:
+                    mask = [j + sim.col_partition_starts[cp] for cp in range(sim.kc)]
+                    HashPIM_rotate(sim, w, ROT[j], row_intermediates[1:], row_intermediates[0], mask)
 
 
     '''
@@ -224,6 +819,8 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
         A[y][2x+3y] = A[x][y]
     '''
 
+    markStep(sim, 'Pi')
+
     INIT0(sim, [col_intermediates[-1]], GateDirection.IN_ROW, col_mask)
     INIT1(sim, col_intermediates[:-1], GateDirection.IN_ROW, col_mask)
     
@@ -264,6 +861,8 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
     Note that we implied De Morgan's law on the original implementation: A[x][y] = A[x][y] ^ (~A[x+1][y] * A[x+2][y]).
     '''
 
+    markStep(sim, 'Chi')
+
     for j in range(y):
         INIT1(sim, col_intermediates[:-1], GateDirection.IN_ROW, col_mask)
         temp_i = 0
@@ -292,6 +891,8 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
         A[0][0] = A[0][0] ^ RC[i]
     '''
 
+    markStep(sim, 'Iota')
+
     INIT1(sim, col_intermediates[:2], GateDirection.IN_ROW, col_mask)
     
     # Coping the round constant (RC) to each unit
@@ -302,3 +903,5 @@ def HashPIM_f(sim: Simulator, m: int, n: int, b: int, w: int, Rnd: int, ir: int)
     XOR(sim, A[0][0], col_intermediates[0], col_intermediates[1], GateDirection.IN_ROW, col_mask)
     INIT1(sim, [A[0][0]], GateDirection.IN_ROW, col_mask)
     OR(sim, col_intermediates[1], col_intermediates[-1], A[0][0], GateDirection.IN_ROW, col_mask)
+
+    markStep(sim, None)
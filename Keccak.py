@@ -0,0 +1,175 @@
+import numpy as np
+from Profiler import Profiler
+
+
+def roundConstants(Rnd: int = 24):
+    """
+    Computes the Keccak-f round constants with the LFSR of the specification (x^8 + x^6 + x^5 + x^4 + 1)
+    :param Rnd: Keccak-f total rounds
+    :return: the round constant of each round, a uint64 array
+    """
+
+    RC = np.zeros(Rnd, dtype=np.uint64)
+    lfsr = 1
+    for ir in range(Rnd):
+        for j in range(7):
+            if lfsr & 1:
+                RC[ir] |= np.uint64(1 << ((1 << j) - 1))
+            lfsr = ((lfsr << 1) ^ 0x71 if lfsr & 0x80 else lfsr << 1) & 0xFF
+    return RC
+
+
+def rotationOffsets(w: int = 64):
+    """
+    Computes the Rho rotation offsets of the specification, (t+1)(t+2)/2 along the Pi orbit of lane A[1][0]
+    :param w: the Keccak-f lane size
+    :return: the offset of each lane (lane A[x][y] at index x+5y), a uint64 array
+    """
+
+    offsets = np.zeros(25, dtype=np.uint64)
+    x, y = 1, 0
+    for t in range(24):
+        offsets[x + 5 * y] = ((t + 1) * (t + 2) // 2) % w
+        x, y = y, (2 * x + 3 * y) % 5
+    return offsets
+
+
+ROUND_CONSTANTS = roundConstants()
+ROTATION_OFFSETS = rotationOffsets()
+
+# The source lane of each lane after Pi: A[y][2x+3y] = A[x][y]
+PI_SOURCES = np.zeros(25, dtype=np.int64)
+for x in range(5):
+    for y in range(5):
+        PI_SOURCES[y + 5 * ((2 * x + 3 * y) % 5)] = x + 5 * y
+
+
+def toLanes(states):
+    """
+    Converts lane-major state bits (bit i of lane j at index i+64j, see Simulator.loadStates) to lanes
+    :param states: the states, a (..., 1600) boolean tensor or array
+    :return: the lanes (lane A[x][y] at index x+5y), a (..., 25) uint64 array
+    """
+
+    bits = np.asarray(states.cpu() if hasattr(states, 'cpu') else states, dtype=np.uint8)
+    packed = np.packbits(bits.reshape(bits.shape[:-1] + (25, 64)), axis=-1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').reshape(bits.shape[:-1] + (25,)).astype(np.uint64)
+
+
+def rotl(A: np.ndarray, offsets):
+    """
+    Rotates lanes left (bit i to bit i+offset), where NumPy shifts a uint64 by 64 to 0
+    """
+    offsets = np.asarray(offsets, dtype=np.uint64)
+    return (A << offsets) | (A >> (np.uint64(64) - offsets))
+
+
+def theta(A: np.ndarray, ir: int):
+    """
+    THETA Step: A[x][y] = A[x][y] ^ C[x-1] ^ (C[x+1] <<< 1), for C[x] = A[x][0] ^ A[x][1] ^ A[x][2] ^ A[x][3] ^ A[x][4]
+    """
+    C = np.bitwise_xor.reduce(A.reshape(-1, 5, 5), axis=1)
+    D = np.roll(C, 1, axis=-1) ^ rotl(np.roll(C, -1, axis=-1), 1)
+    return (A.reshape(-1, 5, 5) ^ D[:, None, :]).reshape(A.shape)
+
+
+def rho(A: np.ndarray, ir: int):
+    """
+    RHO Step: A[x][y] = A[x][y] <<< rot[x][y]
+    """
+    return rotl(A, ROTATION_OFFSETS)
+
+
+def pi(A: np.ndarray, ir: int):
+    """
+    PI Step: A[y][2x+3y] = A[x][y]
+    """
+    return A[..., PI_SOURCES]
+
+
+def chi(A: np.ndarray, ir: int):
+    """
+    CHI Step: A[x][y] = A[x][y] ^ (~A[x+1][y] & A[x+2][y])
+    """
+    rows = A.reshape(-1, 5, 5)
+    return (rows ^ (~np.roll(rows, -1, axis=-1) & np.roll(rows, -2, axis=-1))).reshape(A.shape)
+
+
+def iota(A: np.ndarray, ir: int):
+    """
+    IOTA Step: A[0][0] = A[0][0] ^ RC[ir]
+    """
+    A = A.copy()
+    A[..., 0] ^= ROUND_CONSTANTS[ir]
+    return A
+
+
+# The steps of a round, in order, each a function of the lanes and the round iterator
+STEPS = {'Theta': theta, 'Rho': rho, 'Pi': pi, 'Chi': chi, 'Iota': iota}
+
+
+def keccakF(A: np.ndarray, Rnd: int = 24):
+    """
+    Performs Keccak-f on a batch of states
+    :param A: the lanes of the states, a (..., 25) uint64 array (see toLanes)
+    :param Rnd: Keccak-f total rounds
+    :return: the lanes of the permuted states
+    """
+
+    for ir in range(Rnd):
+        for step in STEPS.values():
+            A = step(A, ir)
+    return A
+
+
+class StateChecker(Profiler):
+    """
+    A profiler that diffs the states of all the units against the reference Keccak-f after each step (see Profiler.step).
+    Each step is checked in isolation: the reference applies the step to the states read before it, so a faulty step
+    is reported where it occurs rather than in all the following steps.
+    """
+
+    def __init__(self, sim, strict: bool = True, first_round: int = 0):
+        """
+        Constructs a state checker for the states currently stored in the simulator (attach it with
+        sim.observers.append(checker))
+        :param sim: the simulation environment
+        :param strict: whether a mismatch fails an assertion (otherwise, the mismatches are collected)
+        :param first_round: the round the run starts at
+        """
+        super().__init__()
+        assert(not sim.dry_run)
+        self.sim = sim
+        self.strict = strict
+        self.round = first_round
+        self.states = self.read()
+
+        # The mismatching steps, as dicts of the round, step, mismatching units and their mismatching lanes
+        self.mismatches = []
+
+    def read(self):
+        """
+        :return: the lanes of all the units, a (units, 25) uint64 array
+        """
+        return toLanes(self.sim.readStates()).reshape(-1, 25)
+
+    def step(self, name: str = None):
+        # The step that ends here
+        previous = next((scope for kind, scope, _ in self.scopes if kind == 'step'), None)
+        super().step(name)
+        if previous not in STEPS:
+            return
+
+        expected = STEPS[previous](self.states, self.round)
+        self.states = self.read()
+
+        mismatch = expected != self.states
+        units = np.flatnonzero(mismatch.any(axis=-1))
+        if len(units) > 0:
+            self.mismatches.append({'round': self.round, 'step': previous, 'units': units.tolist(),
+                                    'lanes': [np.flatnonzero(mismatch[unit]).tolist() for unit in units]})
+            assert(not self.strict), f'{previous} step of round {self.round} mismatches in {len(units)} units ' \
+                                    f'(first unit {units[0]}, lanes {self.mismatches[-1]["lanes"][0]})'
+
+        if previous == 'Iota':
+            self.round += 1
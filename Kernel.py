@@ -0,0 +1,183 @@
+import numba
+import numpy as np
+from simulator import PackedMemory, GateType, GateDirection
+
+
+# The truth table of each logic gate type (bit 2a+b is the output for inputs a and b, where NOT ignores b)
+TRUTH_TABLES = np.array([0b0011, 0b0001, 0b0111, 0b1110], dtype=np.int64)
+
+
+@numba.njit(cache=True)
+def replayWords(words, gates, directions, mask_ids, in_ptr, out_ptr, inputs, outputs, row_masks, col_ptr, col_lines,
+                init_ids, init_rows, checks):
+    """
+    Performs the steps of a compiled trace on packed memory words (see PackedMemory), one gate at a time
+    :param words: the words of the crossbar copies, a (batch, c+1, words) int64 array (updated in place)
+    :param gates: the gate type of each step
+    :param directions: the gate direction of each step
+    :param mask_ids: the mask of each step (the last mask is all the rows/columns)
+    :param in_ptr: the offsets of the inputs of each step
+    :param out_ptr: the offsets of the outputs of each step
+    :param inputs: the input addresses, a pair per gate
+    :param outputs: the output addresses
+    :param row_masks: the packed rows of each mask, a (masks+1, words) int64 array
+    :param col_ptr: the offsets of the columns of each mask
+    :param col_lines: the columns of the masks
+    :param init_ids: the packed output rows of each IN_COLUMN initialization step (-1 for the other steps)
+    :param init_rows: the packed output rows of the IN_COLUMN initializations, a (steps, words) int64 array
+    :param checks: whether each step checks that the output cells of its logic gates (other than NAND) are initialized
+        to 1
+    :return: the first step whose precondition fails (which is not performed, nor any step after it), or -1
+    """
+
+    NOT, NOR, NAND, OR, INIT0, INIT1 = 0, 1, 2, 3, 4, 5
+    one = np.int64(1)
+
+    for s in range(len(gates)):
+        gate = gates[s]
+        mask = mask_ids[s]
+
+        if directions[s] == 0:
+            # IN_ROW: the gates are word-wide along the rows of the mask
+            lines = row_masks[mask]
+            logic = gate != INIT0 and gate != INIT1
+
+            # The outputs are checked before any of them is written, so a failing step leaves the memory as it was
+            if checks[s] and logic and gate != NAND:
+                for o in range(out_ptr[s], out_ptr[s + 1]):
+                    for bt in range(words.shape[0]):
+                        for k in range(words.shape[2]):
+                            if (~words[bt, outputs[o], k] & lines[k]) != 0:
+                                return s
+
+            for o in range(out_ptr[s], out_ptr[s + 1]):
+                output = outputs[o]
+                g = in_ptr[s] + o - out_ptr[s]
+                for bt in range(words.shape[0]):
+                    for k in range(words.shape[2]):
+                        if gate == INIT0:
+                            words[bt, output, k] &= ~lines[k]
+                        elif gate == INIT1:
+                            words[bt, output, k] |= lines[k]
+                        else:
+                            a = words[bt, inputs[g, 0], k]
+                            b = words[bt, inputs[g, 1], k]
+                            current = words[bt, output, k]
+                            if gate == NOT:
+                                result = ~a
+                            elif gate == NOR:
+                                result = ~(a | b)
+                            elif gate == NAND:
+                                result = ~(a & b)
+                            else:
+                                result = a | b
+                            words[bt, output, k] = current & (result | ~lines[k])
+
+        else:
+            # IN_COLUMN: the gates operate on one bit of each word of the columns of the mask
+            start, end = col_ptr[mask], col_ptr[mask + 1]
+            if gate == INIT0 or gate == INIT1:
+                # The outputs are initialized together, a word of rows at a time
+                rows = init_rows[init_ids[s]]
+                for k in range(rows.shape[0]):
+                    if rows[k] != 0:
+                        for li in range(start, end):
+                            for bt in range(words.shape[0]):
+                                if gate == INIT0:
+                                    words[bt, col_lines[li], k] &= ~rows[k]
+                                else:
+                                    words[bt, col_lines[li], k] |= rows[k]
+                continue
+
+            # The result bit of the gate for inputs (a, b) is bit 2a+b of its truth table
+            table = TRUTH_TABLES[gate]
+
+            # The outputs are checked before any of them is written
+            if checks[s] and gate != NAND:
+                for o in range(out_ptr[s], out_ptr[s + 1]):
+                    out_word, out_bit = outputs[o] >> 6, outputs[o] & 63
+                    for li in range(start, end):
+                        for bt in range(words.shape[0]):
+                            if ((words[bt, col_lines[li], out_word] >> out_bit) & one) != one:
+                                return s
+
+            for o in range(out_ptr[s], out_ptr[s + 1]):
+                g = in_ptr[s] + o - out_ptr[s]
+                a_word, a_bit = inputs[g, 0] >> 6, inputs[g, 0] & 63
+                b_word, b_bit = inputs[g, 1] >> 6, inputs[g, 1] & 63
+                out_word, out_bit = outputs[o] >> 6, outputs[o] & 63
+                for li in range(start, end):
+                    j = col_lines[li]
+                    for bt in range(words.shape[0]):
+                        a = (words[bt, j, a_word] >> a_bit) & one
+                        b = (words[bt, j, b_word] >> b_bit) & one
+                        # Reset the output bit when the result is 0 (without a data-dependent branch)
+                        words[bt, j, out_word] &= ~((~(table >> (2 * a + b)) & one) << out_bit)
+
+    return -1
+
+
+class KernelProgram:
+    """
+    Represents a compiled trace lowered to the arrays of the JIT-compiled replay kernel (see replayWords), which
+    performs the whole trace on a packed memory in a single call
+    """
+
+    def __init__(self, trace, r: int, c: int):
+        """
+        Lowers a compiled trace
+        :param trace: the compiled trace (see Trace.CompiledTrace)
+        :param r: the number of crossbar rows covered by an unmasked IN_ROW gate
+        :param c: the number of crossbar columns covered by an unmasked IN_COLUMN gate
+        """
+
+        # The last mask is all the rows/columns (for the steps without a mask)
+        masks = [mask.cpu().numpy() for mask in trace.masks]
+        rows = masks + [np.arange(r)]
+        cols = masks + [np.arange(c)]
+
+        self.directions = trace.directions.numpy().astype(np.int64)
+        self.mask_ids = np.where(trace.mask_ids.numpy() >= 0, trace.mask_ids.numpy(), len(masks)).astype(np.int64)
+
+        # Only the masks of IN_ROW steps are packed into words of rows (the others are masks of columns)
+        in_row = set(self.mask_ids[self.directions == GateDirection.IN_ROW.value].tolist())
+        self.row_masks = np.zeros((len(rows), (r + 64) // 64), dtype=np.int64)
+        for i, mask in enumerate(rows):
+            if i in in_row:
+                np.bitwise_or.at(self.row_masks[i], mask // 64, np.left_shift(1, mask % 64).astype(np.int64))
+
+        self.col_ptr = np.cumsum([0] + [len(mask) for mask in cols]).astype(np.int64)
+        self.col_lines = np.concatenate(cols).astype(np.int64)
+
+        self.gates = trace.gates.numpy().astype(np.int64)
+        self.in_ptr = trace.in_ptr.numpy().astype(np.int64)
+        self.out_ptr = trace.out_ptr.numpy().astype(np.int64)
+        self.inputs = trace.inputs.cpu().numpy().astype(np.int64).reshape(-1, 2)
+        self.outputs = trace.outputs.cpu().numpy().astype(np.int64)
+        self.cycles = trace.cycles.numpy()
+
+        # The output rows of each IN_COLUMN initialization, packed into words
+        inits = np.flatnonzero((self.directions == GateDirection.IN_COLUMN.value) &
+                               ((self.gates == GateType.INIT0.value) | (self.gates == GateType.INIT1.value)))
+        self.init_ids = np.full(len(self.gates), -1, dtype=np.int64)
+        self.init_ids[inits] = np.arange(len(inits))
+        self.init_rows = np.zeros((len(inits), (r + 64) // 64), dtype=np.int64)
+        for i, step in enumerate(inits):
+            rows = self.outputs[self.out_ptr[step]:self.out_ptr[step + 1]]
+            np.bitwise_or.at(self.init_rows[i], rows // 64, np.left_shift(1, rows % 64).astype(np.int64))
+
+    def run(self, memory: PackedMemory, checks: np.ndarray = None):
+        """
+        Performs the program on a packed memory (on the CPU), in place
+        :param memory: the packed memory
+        :param checks: whether each step checks that the output cells of its logic gates (other than NAND) are
+            initialized (default: all the steps)
+        """
+
+        assert(memory.words.device.type == 'cpu' and memory.words.is_contiguous())
+        checks = checks if checks is not None else np.ones(len(self.gates), dtype=bool)
+        words = memory.words.numpy().reshape(-1, *memory.words.shape[-2:])
+        failed = replayWords(words, self.gates, self.directions, self.mask_ids, self.in_ptr, self.out_ptr, self.inputs,
+                             self.outputs, self.row_masks, self.col_ptr, self.col_lines, self.init_ids, self.init_rows,
+                             checks)
+        assert(failed < 0), f'uninitialized output in step {failed} (cycle {self.cycles[failed]})'
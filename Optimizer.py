@@ -0,0 +1,85 @@
+import numpy as np
+from typing import List
+from simulator import Simulator, ParallelOperation, Operation, GateType, GateDirection
+
+
+def optimize(sim: Simulator, parallelOps: List[ParallelOperation], steps: List[str] = None):
+    """
+    Removes the redundant initializations of a recorded stream of operations (a peephole optimizer).
+    The value of each cell is tracked when it is known to be constant (after an initialization, until a gate writes it):
+    the outputs of an initialization whose cells already hold its value are dropped, initializations left without
+    outputs are removed, and adjacent initializations of the same type, direction and mask are merged into one cycle.
+    The cells written outside of the stream (e.g., the constants) are unknown.
+    :param sim: the simulator the operations were recorded on (used for the geometry)
+    :param parallelOps: the recorded parallel operations, in execution order
+    :param steps: the step of each recorded parallel operation (see Scheduler.record)
+    :return: the optimized parallel operations, and a dict of the (cycles, optimized, saved) cycles of each step
+    """
+
+    steps = steps if steps is not None else ['-'] * len(parallelOps)
+
+    # The known value of each cell (-1 when unknown)
+    known = np.full((sim.r + 1, sim.c + 1), -1, dtype=np.int8)
+
+    # The lines of each mask (by the identity of the mask list, which is kept alive alongside)
+    masks = {}
+
+    def lines(mask, gateDirection):
+        if mask is None:
+            return np.arange(sim.r if gateDirection == GateDirection.IN_ROW else sim.c)
+        cached = masks.get(id(mask))
+        if cached is None or cached[0] is not mask:
+            cached = (mask, np.array(mask, dtype=np.int64))
+            masks[id(mask)] = cached
+        return cached[1]
+
+    def cells(gateDirection, addresses, mask):
+        addresses = np.array(addresses, dtype=np.int64)
+        if gateDirection == GateDirection.IN_ROW:
+            return np.ix_(lines(mask, gateDirection), addresses)
+        return np.ix_(addresses, lines(mask, gateDirection))
+
+    program = []
+    report = {}
+    for parallelOp, step in zip(parallelOps, steps):
+        report.setdefault(step, {'cycles': 0, 'optimized': 0, 'saved': 0})['cycles'] += 1
+
+        ops = []
+        for op in parallelOp.ops:
+            index = cells(op.gateDirection, op.outputs, op.mask)
+
+            if op.gateType == GateType.INIT0 or op.gateType == GateType.INIT1:
+                value = int(op.gateType == GateType.INIT1)
+
+                # Keep the outputs that do not hold the value in all the lines of the mask
+                axis = 0 if op.gateDirection == GateDirection.IN_ROW else 1
+                redundant = (known[index] == value).all(axis=axis)
+                outputs = [output for output, skip in zip(op.outputs, redundant.tolist()) if not skip]
+                if outputs:
+                    ops.append(Operation(op.gateType, op.gateDirection, [], outputs, op.mask))
+                    known[cells(op.gateDirection, outputs, op.mask)] = value
+            else:
+                # A gate only keeps or resets its output cells, so cells known to be 0 remain 0
+                known[index] = np.where(known[index] == 0, 0, -1)
+                ops.append(op)
+
+        if not ops:
+            continue
+
+        # Merge with the previous cycle, if both are initializations of the same type, direction and mask
+        previous = program[-1][0].ops if program else []
+        if len(ops) == 1 and len(previous) == 1 and not ops[0].inputs and not previous[0].inputs and \
+                (ops[0].gateType, ops[0].gateDirection) == (previous[0].gateType, previous[0].gateDirection) and \
+                (ops[0].mask is previous[0].mask or ops[0].mask == previous[0].mask):
+            merged = previous[0].outputs + [output for output in ops[0].outputs if output not in previous[0].outputs]
+            program[-1][0] = ParallelOperation([Operation(ops[0].gateType, ops[0].gateDirection, [], merged, ops[0].mask)])
+            continue
+
+        program.append([ParallelOperation(ops), step])
+
+    for _, step in program:
+        report[step]['optimized'] += 1
+    for entry in report.values():
+        entry['saved'] = entry['cycles'] - entry['optimized']
+
+    return [parallelOp for parallelOp, _ in program], report
@@ -0,0 +1,89 @@
+import numpy as np
+from simulator import GateType, GateDirection
+
+
+# The symbolic value of a cell: known to be 0, known to be 1, or unknown
+UNKNOWN = 2
+
+
+def symbolicTable(function):
+    """
+    Tabulates a logic function of two bits over the symbolic values: the result is known when it is the same for all
+    the values of the unknown inputs
+    :param function: the logic function, of two bits
+    :return: the symbolic result of each pair (a, b) of symbolic values at index 3a+b, a uint8 array
+    """
+
+    table = np.zeros(9, dtype=np.uint8)
+    for a in range(3):
+        for b in range(3):
+            results = {function(x, y) for x in ([a] if a != UNKNOWN else [0, 1]) for y in ([b] if b != UNKNOWN else [0, 1])}
+            table[3 * a + b] = results.pop() if len(results) == 1 else UNKNOWN
+    return table
+
+
+# The symbolic result of each logic gate type (NOT ignores b), and the AND of the current output with the result
+GATE_TABLES = {GateType.NOT: symbolicTable(lambda a, b: 1 - a), GateType.NOR: symbolicTable(lambda a, b: 1 - (a | b)),
+               GateType.NAND: symbolicTable(lambda a, b: 1 - (a & b)), GateType.OR: symbolicTable(lambda a, b: a | b)}
+AND_TABLE = symbolicTable(lambda a, b: a & b)
+
+
+def analyze(trace, known: np.ndarray = None):
+    """
+    Proves statically that the output cells of every logic gate (other than NAND) of a compiled trace are initialized
+    to 1 when the gate is performed, which the simulator otherwise checks at runtime (see Execution). The value of each
+    cell is tracked symbolically as known to be 0, known to be 1, or unknown: the initializations set the value of
+    their outputs, and a gate writes the AND of the current value of its outputs and the symbolic result of its inputs.
+    The cells written outside of the trace (e.g., the states and the constants) are unknown.
+    :param trace: the compiled trace (see Trace.CompiledTrace)
+    :param known: the symbolic value of each cell before the trace, a (r+1, c+1) uint8 array of 0, 1 and UNKNOWN
+        (default: all unknown), updated in place
+    :return: the violations, as dicts of the step, cycle, gate type and the number of output cells that are not known
+        to be 1 (the trace is proven when there are none)
+    """
+
+    known = known if known is not None else np.full((trace.r + 1, trace.c + 1), UNKNOWN, dtype=np.uint8)
+
+    masks = [mask.cpu().numpy() for mask in trace.masks]
+    gates = trace.gates.tolist()
+    directions = trace.directions.tolist()
+    mask_ids = trace.mask_ids.tolist()
+    cycles = trace.cycles.tolist()
+    in_ptr = trace.in_ptr.tolist()
+    out_ptr = trace.out_ptr.tolist()
+    inputs = trace.inputs.cpu().numpy()
+    outputs = trace.outputs.cpu().numpy()
+
+    all_rows = np.arange(trace.r)
+    all_cols = np.arange(trace.c)
+
+    violations = []
+    for s, (gate, direction, mask_id) in enumerate(zip(gates, directions, mask_ids)):
+        gateType = GateType(gate)
+        step_outputs = outputs[out_ptr[s]:out_ptr[s + 1]]
+
+        if direction == GateDirection.IN_ROW.value:
+            lines = masks[mask_id] if mask_id >= 0 else all_rows
+            index = lambda addrs: np.ix_(lines, addrs)
+        else:
+            lines = masks[mask_id] if mask_id >= 0 else all_cols
+            index = lambda addrs: (addrs[:, None], lines[None, :])
+
+        if gateType == GateType.INIT0 or gateType == GateType.INIT1:
+            known[index(step_outputs)] = int(gateType == GateType.INIT1)
+            continue
+
+        step_inputs = inputs[in_ptr[s]:in_ptr[s + 1]]
+        a = known[index(step_inputs[:, 0])]
+        b = known[index(step_inputs[:, 1])]
+        current = known[index(step_outputs)]
+
+        result = GATE_TABLES[gateType][3 * a + b]
+        if gateType != GateType.NAND:
+            unproven = int((current != 1).sum())
+            if unproven > 0:
+                violations.append({'step': s, 'cycle': cycles[s], 'gate': gateType.name, 'cells': unproven})
+
+        known[index(step_outputs)] = AND_TABLE[3 * current + result]
+
+    return violations
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import time
+from contextlib import contextmanager, ExitStack
+from functools import wraps
+
+
+class Profiler:
+    """
+    Collects a breakdown of the latency (cycles), energy (switchings) and host wall time of the operations performed
+    on a simulator, by step (e.g., Theta), by primitive (e.g., XOR) and by gate type (e.g., NOR)
+    """
+
+    KINDS = ('step', 'primitive', 'gate')
+
+    def __init__(self):
+        """
+        Constructs an empty profiler (attach it with sim.profiler = profiler, or sim.observers.append(profiler)
+        alongside other profilers)
+        """
+
+        # The active scopes, outermost first, as (kind, name, start time)
+        self.scopes = []
+
+        # The totals of each (kind, name), and of each path of scope names
+        self.totals = {kind: {} for kind in Profiler.KINDS}
+        self.tree = {}
+
+    @staticmethod
+    def entry(table: dict, key):
+        """
+        :return: the (zero-initialized) totals of the given key in the given table
+        """
+        if key not in table:
+            table[key] = {'cycles': 0, 'switchings': 0, 'wall_time': 0.0}
+        return table[key]
+
+    def push(self, kind: str, name: str):
+        """
+        Opens a scope
+        :param kind: the kind of scope ('step' or 'primitive')
+        :param name: the name of the scope
+        """
+        self.scopes.append((kind, name, time.perf_counter()))
+
+    def pop(self):
+        """
+        Closes the innermost scope, charging its wall time
+        """
+        kind, name, start = self.scopes.pop()
+        wall_time = time.perf_counter() - start
+        Profiler.entry(self.totals[kind], name)['wall_time'] += wall_time
+        Profiler.entry(self.tree, self.path() + (name,))['wall_time'] += wall_time
+
+    def path(self):
+        """
+        :return: the names of the active scopes, outermost first
+        """
+        return tuple(name for _, name, _ in self.scopes)
+
+    @contextmanager
+    def scope(self, kind: str, name: str):
+        """
+        A context manager for a scope
+        :param kind: the kind of scope ('step' or 'primitive')
+        :param name: the name of the scope
+        """
+        self.push(kind, name)
+        try:
+            yield
+        finally:
+            self.pop()
+
+    def step(self, name: str = None):
+        """
+        Marks the start of a step region, closing the previous step (and any scope opened within it)
+        :param name: the name of the step, or None to only close the previous step
+        """
+        if any(kind == 'step' for kind, _, _ in self.scopes):
+            while self.scopes[-1][0] != 'step':
+                self.pop()
+            self.pop()
+        if name is not None:
+            self.push('step', name)
+
+    def report(self, gateType, cycles: int, switchings: int, wall_time: float):
+        """
+        Charges a performed operation to the active scopes
+        :param gateType: the type of the gates
+        :param cycles: the number of cycles
+        :param switchings: the number of switchings
+        :param wall_time: the host time of the simulation, in seconds
+        """
+
+        step = next((name for kind, name, _ in self.scopes if kind == 'step'), '-')
+        primitive = next((name for kind, name, _ in self.scopes if kind == 'primitive'), 'perform')
+
+        for kind, name in (('step', step), ('primitive', primitive), ('gate', gateType.name)):
+            entry = Profiler.entry(self.totals[kind], name)
+            entry['cycles'] += cycles
+            entry['switchings'] += switchings
+            # The wall time of the scopes is charged when they are closed
+            if kind == 'gate' or name == 'perform':
+                entry['wall_time'] += wall_time
+
+        path = self.path() + (gateType.name,)
+        for i in range(1, len(path) + 1):
+            entry = Profiler.entry(self.tree, path[:i])
+            entry['cycles'] += cycles
+            entry['switchings'] += switchings
+        Profiler.entry(self.tree, path)['wall_time'] += wall_time
+
+    def toDict(self):
+        """
+        :return: the breakdown by step, primitive and gate type, and the hierarchical breakdown by scope path
+        """
+        result = {kind: dict(self.totals[kind]) for kind in Profiler.KINDS}
+        result['tree'] = {'/'.join(path): entry for path, entry in self.tree.items()}
+        return result
+
+    def toJSON(self, path: str = None):
+        """
+        Exports the breakdown as JSON
+        :param path: the file to write to (the JSON is returned when None)
+        """
+        data = json.dumps(self.toDict(), indent=2)
+        if path is None:
+            return data
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def toCSV(self, path: str = None):
+        """
+        Exports the breakdown as CSV, with a row of (kind, name, cycles, switchings, wall_time) per entry
+        :param path: the file to write to (the CSV is returned when None)
+        """
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(['kind', 'name', 'cycles', 'switchings', 'wall_time'])
+        for kind, table in self.toDict().items():
+            for name, entry in table.items():
+                writer.writerow([kind, name, entry['cycles'], entry['switchings'], f"{entry['wall_time']:.6f}"])
+        if path is None:
+            return out.getvalue()
+        with open(path, 'w', newline='') as f:
+            f.write(out.getvalue())
+
+
+def markStep(sim, name: str = None):
+    """
+    Marks the start of a step region on the profilers of the simulator, if any (see Profiler.step)
+    :param sim: the simulation environment
+    :param name: the name of the step, or None to close the previous step
+    """
+    for profiler in sim.profilers():
+        profiler.step(name)
+
+
+def primitive(function):
+    """
+    Attributes the operations performed by a logic primitive (e.g., Utilities.XOR) to a scope named after it
+    """
+
+    @wraps(function)
+    def wrapper(sim, *args, **kwargs):
+        profilers = sim.profilers()
+        if not profilers:
+            return function(sim, *args, **kwargs)
+        with ExitStack() as scopes:
+            for profiler in profilers:
+                scopes.enter_context(profiler.scope('primitive', function.__name__))
+            return function(sim, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,135 @@
+from typing import List
+from simulator import Simulator, ParallelOperation, Operation, GateDirection
+from Profiler import Profiler
+
+
+class StepRecorder(Profiler):
+    """
+    A profiler that also records the step (see Profiler.step) of each performed cycle
+    """
+
+    def __init__(self):
+        """
+        Constructs an empty step recorder
+        """
+        super().__init__()
+        self.cycle_steps = []
+
+    def report(self, gateType, cycles: int, switchings: int, wall_time: float):
+        super().report(gateType, cycles, switchings, wall_time)
+        step = next((name for kind, name, _ in self.scopes if kind == 'step'), '-')
+        self.cycle_steps.extend([step] * cycles)
+
+
+def record(sim: Simulator, program):
+    """
+    Runs a program on the simulator while recording its parallel operations and the step of each
+    :param sim: the simulation environment
+    :param program: a function of a simulator, that runs the program on it
+    :return: the recorded parallel operations, and the step of each
+    """
+
+    recorder = StepRecorder()
+    sim.trace = []
+    sim.observers.append(recorder)
+    try:
+        program(sim)
+        return sim.trace, recorder.cycle_steps
+    finally:
+        sim.trace = None
+        sim.observers.remove(recorder)
+
+
+def schedule(sim: Simulator, parallelOps: List[ParallelOperation], steps: List[str] = None):
+    """
+    Packs a recorded stream of operations into fewer parallel operations. The operations are list-scheduled in their
+    original order, each into the earliest cycle after the operations it depends on (a read/write of the same
+    (row partition, column partition) tile) that it can legally join: the same direction and mask, and a span of
+    partitions disjoint from the operations already in the cycle (see Simulator.checkCollisions).
+    Initializations are independent for each output, so they are first split by partition.
+    :param sim: the simulator the operations were recorded on (used for the geometry)
+    :param parallelOps: the recorded parallel operations, in execution order
+    :param steps: the step of each recorded parallel operation (see record)
+    :return: the optimized parallel operations, and a dict of the (cycles, scheduled, saved) cycles of each step, where
+        each optimized cycle is attributed to the step of its first operation
+    """
+
+    kc = len(sim.col_partition_sizes)
+    steps = steps if steps is not None else ['-'] * len(parallelOps)
+
+    # The partitions of each interned mask (by the identity of the mask list, which is kept alive alongside)
+    masks = {}
+    mask_keys = {}
+
+    def maskPartitions(mask, translation):
+        cached = masks.get(id(mask))
+        if cached is None or cached[0] is not mask:
+            key = mask_keys.setdefault(tuple(mask), len(mask_keys))
+            cached = (mask, key, sorted(set(translation[i] for i in mask)))
+            masks[id(mask)] = cached
+        return cached[1], cached[2]
+
+    # The last cycle that wrote and read each tile
+    last_write = [-1] * (len(sim.row_partition_sizes) * kc)
+    last_read = [-1] * (len(sim.row_partition_sizes) * kc)
+
+    # The direction, mask, occupied partitions (a bit mask) and operations of each cycle, and its first operation's step
+    cycles = []
+
+    for parallelOp, step in zip(parallelOps, steps):
+        for op in parallelOp.ops:
+            if op.gateDirection == GateDirection.IN_ROW:
+                translation, other = sim.col_addr_to_partition, sim.row_addr_to_partition
+                tile = lambda p, q: q * kc + p
+            else:
+                translation, other = sim.row_addr_to_partition, sim.col_addr_to_partition
+                tile = lambda p, q: p * kc + q
+
+            if op.mask is None:
+                mask_key, lines = -1, sorted(set(other))
+            else:
+                mask_key, lines = maskPartitions(op.mask, other)
+
+            # Each initialization is split by the partitions of its outputs
+            if op.inputs:
+                parts = [op]
+            else:
+                outputs = {}
+                for output in op.outputs:
+                    outputs.setdefault(translation[output], []).append(output)
+                parts = [Operation(op.gateType, op.gateDirection, [], outputs[p], op.mask) for p in sorted(outputs)]
+
+            for part in parts:
+                reads = {tile(translation[a], q) for a in part.inputs for q in lines}
+                writes = {tile(translation[a], q) for a in part.outputs for q in lines}
+
+                # The outputs are also read (a gate only switches the output cells it does not keep)
+                earliest = 1 + max([last_write[t] for t in reads | writes] + [last_read[t] for t in writes])
+
+                addresses = part.inputs + part.outputs
+                lo, hi = translation[min(addresses)], translation[max(addresses)]
+                span = (1 << (hi + 1)) - (1 << lo)
+
+                t = earliest
+                while t < len(cycles) and not (cycles[t][0] == part.gateDirection and cycles[t][1] == mask_key
+                                               and cycles[t][2] & span == 0):
+                    t += 1
+                if t == len(cycles):
+                    cycles.append([part.gateDirection, mask_key, 0, [], step])
+                cycles[t][2] |= span
+                cycles[t][3].append(part)
+
+                for s in reads | writes:
+                    last_read[s] = max(last_read[s], t)
+                for s in writes:
+                    last_write[s] = max(last_write[s], t)
+
+    report = {}
+    for step in steps:
+        report.setdefault(step, {'cycles': 0, 'scheduled': 0, 'saved': 0})['cycles'] += 1
+    for cycle in cycles:
+        report[cycle[4]]['scheduled'] += 1
+    for entry in report.values():
+        entry['saved'] = entry['cycles'] - entry['scheduled']
+
+    return [ParallelOperation(cycle[3]) for cycle in cycles], report
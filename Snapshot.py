@@ -0,0 +1,41 @@
+from Profiler import Profiler
+
+
+class SnapshotWriter(Profiler):
+    """
+    A profiler that writes a snapshot of the simulator (see Simulator.saveSnapshot) at the end of every round, or of
+    every step (see Profiler.step), with the position {'round': round, 'step': step} of the step that ended
+    """
+
+    def __init__(self, sim, path: str, steps: bool = False, first_round: int = 0):
+        """
+        Constructs a snapshot writer (attach it with sim.observers.append(writer))
+        :param sim: the simulation environment
+        :param path: the snapshot file of each position, formatted with the round and step (e.g., 'run_{round:02d}.snap')
+        :param steps: whether to write a snapshot after each step, rather than after the last step of each round
+        :param first_round: the round the run starts at
+        """
+        super().__init__()
+        self.sim = sim
+        self.pattern = path
+        self.steps = steps
+        self.round = first_round
+
+        # The written snapshot files, in order
+        self.written = []
+
+    def step(self, name: str = None):
+        # The step that ends here
+        previous = next((scope for kind, scope, _ in self.scopes if kind == 'step'), None)
+        super().step(name)
+        if previous is None:
+            return
+
+        # The last step of a round is the one closed without opening another (see HashPIM_f)
+        if self.steps or name is None:
+            path = self.pattern.format(round=self.round, step=previous)
+            self.sim.saveSnapshot(path, {'round': self.round, 'step': previous})
+            self.written.append(path)
+
+        if name is None:
+            self.round += 1
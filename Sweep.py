@@ -0,0 +1,69 @@
+import csv
+from itertools import product
+from multiprocessing import Pool
+from simulator import Technology, MAGIC
+from HashPIM import HashPIM_dryRun, HashPIM_report, HashPIM_layout
+
+
+# The columns of the sweep table (see HashPIM_report)
+COLUMNS = ['row', 'col', 'units', 'r', 'technology', 'cycles', 'switchings', 'time', 'energy', 'f',
+           'tput_unit', 'tput_system', 'power_system', 'tput_power', 'tput_area']
+
+
+def HashPIM_evaluate(row: int, col: int, rates: list, technology: Technology, N_XB: int = 1, m: int = 72, n: int = 37):
+    """
+    Evaluates a crossbar geometry and gate technology for several rates, with a single dry run
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param rates: the SHA-3 rates
+    :param technology: the delay and energy of the gates
+    :param N_XB: the number of crossbar arrays
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :return: a row of the sweep table (see COLUMNS) per rate
+    """
+
+    sim = HashPIM_dryRun(row, col, m, n, technology=technology)
+    units = (len(sim.row_partition_sizes) - 1) * (len(sim.col_partition_sizes) - 1)
+
+    return [{'row': row, 'col': col, 'units': units, 'r': r, 'technology': technology.name,
+             **HashPIM_report(sim, r, units, N_XB)} for r in rates]
+
+
+def HashPIM_sweep(rows: list, cols: list, rates: list = (1152, 1088, 832, 576), technologies: list = (MAGIC,),
+                  N_XB: int = 1, m: int = 72, n: int = 37, key: str = 'tput_area', processes: int = None,
+                  path: str = None):
+    """
+    Evaluates a grid of crossbar geometries, rates and gate technologies, and ranks them.
+    Each (geometry, technology) is evaluated once for all the rates (see HashPIM_evaluate), in a pool of processes.
+    :param rows: the numbers of memristive rows of the crossbar array
+    :param cols: the numbers of memristive columns of the crossbar array
+    :param rates: the SHA-3 rates
+    :param technologies: the gate technologies
+    :param N_XB: the number of crossbar arrays
+    :param m: the number of rows in each SHA-3 unit
+    :param n: the number of columns in each SHA-3 unit
+    :param key: the column (see COLUMNS) the table is ranked by, highest first
+    :param processes: the number of processes (default: the number of CPUs)
+    :param path: a .csv file to write the ranked table to
+    :return: the ranked table, as a list of rows
+    """
+
+    assert(key in COLUMNS)
+
+    # The geometries that fit at least one unit, as well as the ROT rows and RC columns
+    geometries = [(row, col) for row, col in product(rows, cols) if min(HashPIM_layout(row, col, m, n)) > 0]
+
+    with Pool(processes) as pool:
+        tables = pool.starmap(HashPIM_evaluate, [(row, col, rates, technology, N_XB, m, n)
+                                                 for (row, col), technology in product(geometries, technologies)])
+
+    table = sorted(sum(tables, []), key=lambda entry: entry[key], reverse=True)
+
+    if path is not None:
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(table)
+
+    return table
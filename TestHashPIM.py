@@ -1,19 +1,34 @@
 import torch
 import random
-from simulator import Simulator
+import time
+import os
+import tempfile
+from simulator import Simulator, MultiCrossbarSimulator, MemoryBackend, Technology, MAGIC, ParallelOperation, Operation, \
+    GateType, GateDirection, Execution, Validation
 from HashPIM import *
-from Cryptodome.Hash import SHA3_224, SHA3_256, SHA3_384, SHA3_512
+from Profiler import Profiler
+from Sweep import HashPIM_sweep
+from Chip import HashPIM_chip, chipCosts
+from Conformance import HashPIM_conformance, padBlocks
+from Scheduler import record, schedule
+from Keccak import StateChecker, STEPS, keccakF, toLanes
+from Trace import CompiledTrace, diffTraces
+from Preconditions import analyze
+from functools import partial
+from Cryptodome.Hash import SHA3_224, SHA3_256, SHA3_384, SHA3_512, SHAKE128, SHAKE256
 
 
 device = torch.device('cpu')
 
 
 
-def testHashPIM(r: int, digest: int):
+def testHashPIM(r: int, digest: int, batches: int = 1, backend: MemoryBackend = MemoryBackend.BOOL):
     """
     Tests the HashPIM algorithm
     :param r: the SHA-3 rate = {1152,1088,832,576}
     :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param batches: the number of crossbar batches to hash (the batches after the first replay the recorded trace)
+    :param backend: the storage of the simulated crossbar memory
 
 
 
@@ -66,78 +81,1092 @@ def testHashPIM(r: int, digest: int):
     print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
 
 
-    sim = Simulator([m] * r_u + [row - m * r_u], [n] * c_u + [col - n * c_u], device=device)
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    hash_value = loadMessages(sim, r, digest)
 
-    message = torch.zeros(size=(r_u, c_u, b), dtype=torch.int, device=device)
-    message_padded = torch.zeros(size=(r_u, c_u, b), dtype=torch.int, device=device)
+    # Run the HashPIM algorithm, recording it for the following batches
+    trace = HashPIM_record(sim, m, n)
 
-    hash_value = [[0 for i in range(c_u)] for j in range(r_u)]
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
 
+    # The addresses of the gate groups are interned once, and reused by the following rounds
+    assert(len(sim.address_tensors) * Rnd < sim.latency)
+    assert(sim.addressTensors([[0, 1]], [2]) is sim.addressTensors([[0, 1]], [2]))
 
-    for i in range(r_u):
-        for j in range(c_u):
-            # Construct random bit array (limited to r-4 size, and to bytes for compatability with Cryptodome)
-            message_len = random.randrange(0, r-4, 8)
-            message[i][j][:message_len] = torch.rand(size=(message_len, ), device=device) < 0.5
+    # Replay the recorded trace on fresh crossbar arrays with new messages
+    for batch in range(1, batches):
+        replay_sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        hash_value = loadMessages(replay_sim, r, digest)
 
-            # Padding rule
-            message_padded[i][j][:message_len] = message[i][j][:message_len]
-            message_padded[i][j][message_len+1] = 1
-            message_padded[i][j][message_len+2] = 1
-            message_padded[i][j][r-1] = 1
+        HashPIM(replay_sim, m, n, trace)
 
-            message_in_bytes = bytearray(sum(bit*(2**k) for bit,k in zip(byte,range(8))) for byte in zip(*([iter(message[i][j][:message_len])]*8)))
+        assert(replay_sim.readDigests(digest, as_hex=True) == hash_value)
+        assert(replay_sim.latency == sim.latency and replay_sim.energy == sim.energy)
 
-            if digest == 224:
-                hash_value[i][j] = SHA3_224.new(message_in_bytes).hexdigest()
+    print(f'Success with total {sim.latency} cycles and {sim.energy} switchings\n')
+    print('Results (1 round):')
+    print(f'Single Unit: {sim.latency//Rnd} cycles and {sim.energy//(N_u*Rnd)} switchings')
+    print(f'Single XB ({N_u} Units): {sim.latency//Rnd} cycles and {sim.energy//Rnd} switchings\n')
+
+    report = HashPIM_report(sim, r)
+    print(f'Results ({sim.technology.name}, 1 round):')
+    print(f'Single Unit: {report["time"]:.0f} ns and {report["energy"]:.0f} fJ, {report["tput_unit"]:.3f} Gbps')
+    print(f'Single XB ({N_u} Units): {report["tput_system"]:.1f} Gbps, {report["tput_power"]:.0f} Gbps/W, '
+          f'{report["tput_area"]:.0f} bps/F^2\n')
+
+
+def testHashPIMUnits(r: int, digest: int, batch: int = 4096, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Tests the HashPIM algorithm on a unit-level simulation of a batch of SHA-3 units
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param batch: the number of SHA-3 units (and messages)
+    :param backend: the storage of the simulated memory
+    """
 
-            elif digest == 256:
-                hash_value[i][j] = SHA3_256.new(message_in_bytes).hexdigest()
+    row = 1024
+    col = 1024
+    r_u = 14
+    c_u = 27
 
-            elif digest == 384:
-                hash_value[i][j] = SHA3_384.new(message_in_bytes).hexdigest()
+    b = 1600
+    Rnd = 24
 
-            elif digest == 512:
-                hash_value[i][j] = SHA3_512.new(message_in_bytes).hexdigest()
+    m = 72
+    n = 37
 
+    print(f'HashPIM (unit-level): SHA3-{digest}')
+    print(f'Parameters: units={batch}, r={r}, hash value size={digest}\n')
 
-    # Store the vectors in the memory
-    for r_i in range(r_u):
-        for c_i in range(c_u):       
-            for i in range(w):
-                for j in range(b // w):
-                    sim.memory[i+r_i*m][j+c_i*n] = message_padded[r_i][c_i][i+j*w]
+    sim = HashPIM_units(batch, m, n, device=device, backend=backend)
 
+    message_padded, hash_value = randomMessages(r, digest, batch)
+    sim.loadStates(message_padded.reshape(batch, 1, 1, b))
 
-    # Run the HashPIM algorithm
     HashPIM(sim, m, n)
 
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+    latency, energy = HashPIM_scale(sim, r_u, c_u)
+
+    # The scaled counters are those of the whole crossbar, with the serialized copies of each implementation of the Rho step
+    for rho in RhoStrategy:
+        unit = Simulator([m, row - m * r_u], [n, col - n * c_u], device=device, validate=Validation.OFF, dry_run=True)
+        HashPIM(unit, m, n, rho=rho)
+        dry = HashPIM_dryRun(row, col, m, n, rho=rho)
+        assert(HashPIM_scale(unit, r_u, c_u, rho) == (dry.latency, dry.energy))
+
+    print(f'Success with total {sim.latency} cycles and {sim.energy} switchings per unit (as a single-unit crossbar)\n')
+    print('Results (1 round):')
+    print(f'Single Unit: {latency//Rnd} cycles and {sim.energy//Rnd} switchings')
+    print(f'Single XB ({r_u * c_u} Units, scaled): {latency//Rnd} cycles and {energy//Rnd} switchings\n')
+
+
+def testHashPIMCrossbars(r: int, digest: int, crossbars: int = 2, row: int = 1024, col: int = 1024,
+                         backend: MemoryBackend = MemoryBackend.BOOL, jit: bool = False):
+    """
+    Tests the HashPIM algorithm on several crossbar arrays at once, each with its own messages and counters. The
+    messages of crossbar k have k+1 blocks, and each crossbar is idled once its messages are absorbed.
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param crossbars: the number of crossbar arrays (N_XB)
+    :param row: the number of memristive rows in each crossbar array
+    :param col: the number of memristive columns in each crossbar array
+    :param backend: the storage of the simulated memory
+    :param jit: whether the rounds are a compiled trace replayed by the JIT-compiled kernel (requires the packed memory)
+    """
+
+    b = 1600
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM ({crossbars} XBs): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u * crossbars}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, MultiCrossbarSimulator, crossbars=crossbars, backend=backend, jit=jit)
+    trace = HashPIM_record(HashPIM_crossbar(row, col, m, n, device, backend=backend), m, n) if jit else None
+
+    hash_function = {224: SHA3_224, 256: SHA3_256, 384: SHA3_384, 512: SHA3_512}[digest]
+    blocks = torch.zeros(size=(crossbars, N_u, crossbars, r), dtype=torch.bool)
+    hash_value = []
+
+    for x in range(crossbars):
+        for i in range(N_u):
+            message_in_bytes = bytes(random.getrandbits(8) for _ in range(random.randrange(x * r // 8, (x + 1) * r // 8)))
+            hash_value.append(hash_function.new(message_in_bytes).hexdigest())
+            padded, num_blocks = padBlocks(message_in_bytes, r, crossbars)
+            assert(num_blocks == x + 1)
+            blocks[x][i] = torch.from_numpy(padded)
+    blocks = blocks.reshape(crossbars, r_u, c_u, crossbars, r).to(device)
+
+    state = torch.zeros(size=(crossbars, r_u, c_u, b), dtype=torch.bool, device=device)
+    state[..., :r] = blocks[..., 0, :]
+    sim.loadStates(state)
+
+    for k in range(crossbars):
+        # The crossbars whose messages are absorbed are idle, and keep their states and counters
+        sim.setActive(list(range(k, crossbars)))
+        idle = sim.readStates()[:k]
+        counters = [counter.clone() for counter in (sim.latencies, sim.energies, sim.times_ns, sim.energies_fJ)]
+
+        if k > 0:
+            HashPIM_absorb(sim, m, n, r, blocks[..., k, :])
+        HashPIM(sim, m, n, trace)
+
+        assert(torch.equal(sim.readStates()[:k], idle))
+        for counter, previous in zip((sim.latencies, sim.energies, sim.times_ns, sim.energies_fJ), counters):
+            assert((counter[:k] == previous[:k]).all() and (counter[k:] > previous[k:]).all())
+    sim.setActive()
+
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+    assert(int(sim.latencies[-1]) == sim.latency and int(sim.energies[-1]) == sim.energy)
+
+    print(f'Success with total {sim.latency} cycles and {int(sim.energies.sum())} switchings\n')
+    print(f'Results (per XB, for messages of 1 to {crossbars} blocks):')
+    for x in range(crossbars):
+        print(f'XB {x} ({N_u} Units, {x + 1} blocks): {int(sim.latencies[x])} cycles, {int(sim.energies[x])} switchings, '
+              f'{float(sim.times_ns[x]) / 1e3:.1f} us and {float(sim.energies_fJ[x]) / 1e6:.1f} nJ')
+    print()
+
 
-    out_in_bits = [0] * digest
-    output = [[0 for i in range(c_u)] for j in range(r_u)]
+def testHashPIMSharded(r: int, digest: int, row_groups: int = 2, col_groups: int = 2, processes: int = None,
+                       backend: MemoryBackend = MemoryBackend.BOOL, rho: RhoStrategy = RhoStrategy.LOG_SHIFTER):
+    """
+    Tests the HashPIM algorithm on groups of SHA-3 units simulated in parallel worker processes
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row_groups: the number of groups of unit rows
+    :param col_groups: the number of groups of unit columns
+    :param processes: the number of worker processes (default: the number of CPUs)
+    :param backend: the storage of the simulated memory
+    :param rho: the implementation of the Rho step
+    """
 
+    row = 1024
+    col = 1024
+    r_u = 14
+    c_u = 27
+
+    N_u = r_u * c_u
 
-    for r_i in range(r_u):
-        for c_i in range(c_u):
-            cnt = 0
-            for j in range((digest // w) + 1):       
-                for i in range(w):
-                    cnt += 1
-                    if cnt > digest:
-                        break
-                
-                    out_in_bits[i+w*j] = int(sim.memory[i+r_i*m][j+c_i*n])
+    Rnd = 24
+
+    m = 72
+    n = 37
 
-            out_in_bytes = bytearray(sum(bit*(2**k) for bit,k in zip(byte,range(8))) for byte in zip(*([iter(out_in_bits)]*8)))
-            output[r_i][c_i] = "".join(["%02x" % it for it in out_in_bytes])
+    print(f'HashPIM ({row_groups}x{col_groups} tile groups): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
 
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    hash_value = loadMessages(sim, r, digest)
 
-    for i in range(r_i):
-        for j in range(c_i):
-            assert(output[i][j] == hash_value[i][j])
+    HashPIM_sharded(sim, m, n, row_groups, col_groups, processes, rho)
 
+    dry = HashPIM_dryRun(row, col, m, n, rho=rho)
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+    assert((sim.latency, sim.energy) == (dry.latency, dry.energy) and abs(sim.time_ns - dry.time_ns) < 1e-6 * dry.time_ns)
 
     print(f'Success with total {sim.latency} cycles and {sim.energy} switchings\n')
     print('Results (1 round):')
     print(f'Single Unit: {sim.latency//Rnd} cycles and {sim.energy//(N_u*Rnd)} switchings')
     print(f'Single XB ({N_u} Units): {sim.latency//Rnd} cycles and {sim.energy//Rnd} switchings\n')
+
+
+def testHashPIMSchedule(r: int, digest: int, row: int = 1024, col: int = 1024):
+    """
+    Tests the HashPIM algorithm after packing its operations into fewer cycles, and reports the cycles saved per step
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (scheduled): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device)
+    hash_value = loadMessages(sim, r, digest)
+
+    trace, report = HashPIM_schedule(sim, m, n)
+
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+    # Replay the optimized program on a fresh crossbar array with new messages
+    replay_sim = HashPIM_crossbar(row, col, m, n, device)
+    hash_value = loadMessages(replay_sim, r, digest)
+
+    HashPIM(replay_sim, m, n, trace)
+
+    assert(replay_sim.readDigests(digest, as_hex=True) == hash_value)
+    assert(replay_sim.latency == sim.latency - sum(entry['saved'] for entry in report.values()))
+
+    # The scheduler packs a serialized stream (an operation per cycle) back into the cycles of the original program
+    dry_sim = HashPIM_crossbar(row, col, m, n, device, dry_run=True)
+    parallelOps, steps = record(dry_sim, partial(HashPIM, m=m, n=n))
+    serial = [ParallelOperation([op]) for parallelOp in parallelOps for op in parallelOp.ops]
+    assert(len(schedule(dry_sim, serial)[0]) <= len(parallelOps))
+
+    print(f'Success with total {replay_sim.latency} cycles and {replay_sim.energy} switchings '
+          f'(originally {sim.latency} cycles)\n')
+    print('Results (1 round):')
+    for step, entry in report.items():
+        print(f'{step}: {entry["cycles"] // Rnd} cycles, {entry["scheduled"] // Rnd} scheduled, {entry["saved"] // Rnd} saved')
+    print()
+
+
+def testHashPIMOptimize(r: int, digest: int, row: int = 1024, col: int = 1024, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Tests the HashPIM algorithm after removing its redundant initializations, and reports the cycles saved per step
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (optimized): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    hash_value = loadMessages(sim, r, digest)
+
+    # The optimized program is verified against the recorded run
+    trace, report = HashPIM_optimize(sim, m, n)
+
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+    # Replay the optimized program on a fresh crossbar array with new messages
+    replay_sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    hash_value = loadMessages(replay_sim, r, digest)
+
+    HashPIM(replay_sim, m, n, trace)
+
+    assert(replay_sim.readDigests(digest, as_hex=True) == hash_value)
+    assert(replay_sim.latency == sim.latency - sum(entry['saved'] for entry in report.values()))
+
+    print(f'Success with total {replay_sim.latency} cycles and {replay_sim.energy} switchings '
+          f'(originally {sim.latency} cycles and {sim.energy} switchings)\n')
+    print('Results (1 round):')
+    for step, entry in report.items():
+        print(f'{step}: {entry["cycles"] / Rnd:.0f} cycles, {entry["optimized"] / Rnd:.1f} optimized, {entry["saved"] / Rnd:.1f} saved')
+    print()
+
+
+def testHashPIMSponge(r: int, digest: int, max_blocks: int = 3, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Tests the HashPIM algorithm on messages of several r-bit blocks, absorbed in the crossbar array
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param max_blocks: the maximal number of blocks of a message
+    :param backend: the storage of the simulated memory
+    """
+
+    row = 1024
+    col = 1024
+    r_u = 14
+    c_u = 27
+
+    N_u = r_u * c_u
+
+    m = 72
+    n = 37
+
+    print(f'HashPIM (up to {max_blocks} blocks): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+
+    hash_function = {224: SHA3_224, 256: SHA3_256, 384: SHA3_384, 512: SHA3_512}[digest]
+    blocks = torch.zeros(size=(r_u, c_u, max_blocks, r), dtype=torch.bool, device=device)
+    num_blocks = torch.zeros(size=(r_u, c_u), dtype=torch.int64, device=device)
+    hash_value = [[0 for i in range(c_u)] for j in range(r_u)]
+
+    for i in range(r_u):
+        for j in range(c_u):
+            # Construct random byte arrays, padded by the SHA-3 padding rule to a whole number of blocks
+            message_len = random.randrange(0, max_blocks * r - 4, 8)
+            message_in_bytes = bytes(random.getrandbits(8) for _ in range(message_len // 8))
+            hash_value[i][j] = hash_function.new(message_in_bytes).hexdigest()
+
+            padded, num_blocks[i][j] = padBlocks(message_in_bytes, r, max_blocks)
+            blocks[i][j] = torch.from_numpy(padded)
+
+    state = HashPIM_sponge(sim, m, n, r, blocks, num_blocks)
+
+    # The latency is that of the permutations, the absorbed blocks and the reads capturing the units that finished early
+    dry = HashPIM_dryRun(row, col, m, n)
+    permutation = dry.latency
+    HashPIM_absorb(dry, m, n, r, None)
+    captures = sum(bool((num_blocks == k + 1).any()) for k in range(max_blocks - 1))
+    assert(sim.latency == max_blocks * permutation + (max_blocks - 1) * (dry.latency - permutation) + captures * r_u * 64)
+
+    out_in_bits = state[:, :, :digest].reshape(r_u, c_u, -1, 8).to(torch.int64)
+    out_in_bytes = (out_in_bits << torch.arange(8, device=device)).sum(dim=3)
+
+    for i in range(r_u):
+        for j in range(c_u):
+            assert(bytes(out_in_bytes[i][j].tolist()).hex() == hash_value[i][j])
+
+    # Every unit performs max_blocks permutations, and absorbs r bits in each
+    block_latency = sim.latency / max_blocks
+
+    print(f'Success with total {sim.latency} cycles and {sim.energy} switchings\n')
+    print('Results (1 block):')
+    print(f'Single Unit: {block_latency:.0f} cycles, {block_latency / (r // 8):.1f} cycles per byte')
+    print(f'Single XB ({N_u} Units): {block_latency:.0f} cycles, {block_latency / (N_u * r // 8):.3f} cycles per byte\n')
+
+
+def testHashPIMShake(d: int, output_bits: int, max_blocks: int = 2, row: int = 1024, col: int = 1024,
+                     backend: MemoryBackend = MemoryBackend.PACKED):
+    """
+    Tests the HashPIM algorithm for SHAKE128/SHAKE256 with long outputs, squeezed in the crossbar array
+    :param d: the security strength = {128,256}
+    :param output_bits: the number of output bits of each message (a multiple of 8)
+    :param max_blocks: the maximal number of blocks of a message
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    """
+
+    m = 72
+    n = 37
+
+    r = SHAKE_RATES[d]
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (up to {max_blocks} blocks, {output_bits} output bits): SHAKE{d}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, output size={output_bits}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    trace = HashPIM_record(HashPIM_crossbar(row, col, m, n, device, backend=backend), m, n)
+
+    hash_function = {128: SHAKE128, 256: SHAKE256}[d]
+    blocks = torch.zeros(size=(N_u, max_blocks, r), dtype=torch.bool)
+    num_blocks = torch.zeros(size=(N_u, ), dtype=torch.int64)
+    hash_value = []
+
+    for i in range(N_u):
+        # Construct random byte arrays, padded by the SHAKE padding rule to a whole number of blocks
+        message_in_bytes = bytes(random.getrandbits(8) for _ in range(random.randrange(max_blocks * r // 8)))
+        hash_value.append(hash_function.new(message_in_bytes).read(output_bits // 8).hex())
+        padded, num_blocks[i] = padBlocks(message_in_bytes, r, max_blocks, suffix=0x1F)
+        blocks[i] = torch.from_numpy(padded)
+
+    output, squeeze_latency = HashPIM_shake(sim, m, n, d, blocks.reshape(r_u, c_u, max_blocks, r).to(device),
+                                            num_blocks.reshape(r_u, c_u).to(device), output_bits, trace)
+
+    out_in_bits = output.reshape(N_u, -1, 8).to(torch.int64)
+    out_in_bytes = (out_in_bits << torch.arange(8, device=device)).sum(dim=2)
+
+    for i in range(N_u):
+        assert(bytes(out_in_bytes[i].tolist()).hex() == hash_value[i])
+
+    # The absorbing phase reads out the states of the units that finished early, and writes them back before squeezing
+    dry = HashPIM_dryRun(row, col, m, n)
+    permutation = dry.latency
+    HashPIM_absorb(dry, m, n, r, None)
+    captures = sum(bool((num_blocks == k + 1).any()) for k in range(max_blocks - 1))
+    restore = bool((num_blocks < max_blocks).any())
+    assert(sim.latency - squeeze_latency == max_blocks * permutation + (max_blocks - 1) * (dry.latency - permutation) +
+           (captures + restore) * r_u * 64)
+
+    # Each further r bits of output take a permutation and a read
+    squeezes = -(-output_bits // r)
+    block_latency = trace.latency + r_u * 64
+
+    print(f'Success with total {sim.latency} cycles and {sim.energy} switchings\n')
+    print(f'Results (squeezing phase, {squeezes} blocks of {r} bits):')
+    print(f'Single Unit: {squeeze_latency} cycles, {squeeze_latency / (output_bits // 8):.1f} cycles per output byte '
+          f'({block_latency / (r // 8):.1f} for long outputs)')
+    print(f'Single XB ({N_u} Units): {squeeze_latency} cycles, {squeeze_latency / (N_u * output_bits // 8):.3f} cycles '
+          f'per output byte ({block_latency / (N_u * r // 8):.3f} for long outputs)\n')
+
+
+def testHashPIMProfile(r: int, digest: int, row: int = 1024, col: int = 1024, dry_run: bool = True, path: str = None):
+    """
+    Profiles the HashPIM algorithm by step, primitive and gate type
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param dry_run: whether only the latency and energy are profiled (a single round, without simulating the memory)
+    :param path: a .json or .csv file to export the profile to
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (profile): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, dry_run=dry_run)
+    sim.profiler = Profiler()
+
+    if not dry_run:
+        hash_value = loadMessages(sim, r, digest)
+
+    HashPIM(sim, m, n)
+
+    if not dry_run:
+        assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+    # A dry run profiles a single round
+    rounds = 1 if dry_run else Rnd
+    profile = sim.profiler.toDict()
+
+    # The step results for a single round (the Rho and Iota copies are serialized per partition, see HashPIM_scale)
+    if (row, col) == (1024, 1024):
+        expected = {'Theta': (330, 15127), 'Rho': (2911, 82300), 'Pi': (81, 6976), 'Chi': (140, 14720), 'Iota': (32, 448)}
+        for step, (latency, energy) in expected.items():
+            assert(profile['step'][step]['cycles'] == latency * rounds)
+            assert(profile['step'][step]['switchings'] == energy * rounds * N_u)
+
+    print('Results (1 round, switchings per unit):')
+    for kind in Profiler.KINDS:
+        print(f'{kind.capitalize():<10} {"Cycles":>8} {"Switchings":>12} {"Time (s)":>10}')
+        for name, entry in profile[kind].items():
+            print(f'{name:<10} {entry["cycles"] // rounds:>8} {entry["switchings"] // (rounds * N_u):>12} '
+                  f'{entry["wall_time"] / rounds:>10.4f}')
+        print()
+
+    if path is not None:
+        if path.endswith('.csv'):
+            sim.profiler.toCSV(path)
+        else:
+            sim.profiler.toJSON(path)
+
+
+def testHashPIMRho(r: int, digest: int, row: int = 1024, col: int = 1024, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Tests the HashPIM algorithm with each implementation of the Rho step, and compares their Rho step results
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (Rho strategies): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    results = {}
+    for rho in RhoStrategy:
+        sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        sim.profiler = Profiler()
+        hash_value = loadMessages(sim, r, digest)
+
+        HashPIM(sim, m, n, rho=rho)
+
+        assert(sim.readDigests(digest, as_hex=True) == hash_value)
+        results[rho] = sim
+
+    # The other steps are the same for all the strategies
+    for step in ['Theta', 'Pi', 'Chi', 'Iota']:
+        assert(len(set(sim.profiler.totals['step'][step]['cycles'] for sim in results.values())) == 1)
+
+    print('Results (1 round, switchings per unit):')
+    print(f'{"Strategy":<16} {"Rho cycles":>10} {"Rho switchings":>16} {"Total cycles":>14}')
+    for rho, sim in results.items():
+        entry = sim.profiler.totals['step']['Rho']
+        print(f'{rho.name:<16} {entry["cycles"] // Rnd:>10} {entry["switchings"] // (Rnd * N_u):>16} {sim.latency // Rnd:>14}')
+    print()
+
+
+def testHashPIMReference(r: int, digest: int, row: int = 1024, col: int = 1024, backend: MemoryBackend = MemoryBackend.BOOL):
+    """
+    Tests the HashPIM algorithm step by step against the reference Keccak-f, and checks that a faulty step is located
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    """
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (reference): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    # The reference itself is checked against Cryptodome
+    messages = randomMessages(r, digest, N_u)
+    message_padded, hash_value = messages
+    lanes = keccakF(toLanes(message_padded))
+    assert([bytes(lanes[i].astype('<u8').tobytes()[:digest // 8]).hex() for i in range(N_u)] == hash_value)
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    loadMessages(sim, r, digest, messages)
+
+    assert(HashPIM_check(sim, m, n) == [])
+    assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+    # A bit flipped in the last unit at the start of the Iota step of round 1 is reported for that step only
+    class FaultyChecker(StateChecker):
+        def step(self, name: str = None):
+            super().step(name)
+            if name == 'Iota' and self.round == 1:
+                cell = (..., sim.relToAbsRow(r_u - 1, 5), sim.relToAbsCol(c_u - 1, 7))
+                sim.memory[cell] = not bool(sim.memory[cell])
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+    loadMessages(sim, r, digest, messages)
+    checker = FaultyChecker(sim, strict=False)
+    sim.observers.append(checker)
+    HashPIM(sim, m, n)
+
+    assert(checker.mismatches == [{'round': 1, 'step': 'Iota', 'units': [N_u - 1], 'lanes': [[7]]}])
+
+    print(f'Success with all the {N_u} units matching the reference after each of the {24 * 5} steps\n')
+
+
+def testHashPIMSnapshot(r: int, digest: int, row: int = 1024, col: int = 1024, backend: MemoryBackend = MemoryBackend.BOOL,
+                        directory: str = None):
+    """
+    Tests the HashPIM algorithm with a snapshot after every round, resuming runs from the snapshots and bisecting the
+    steps of a round against the reference Keccak-f
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    :param directory: the directory of the snapshot files (a temporary directory by default)
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (snapshots): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    with tempfile.TemporaryDirectory() as temp:
+        directory = directory if directory is not None else temp
+
+        sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        hash_value = loadMessages(sim, r, digest)
+
+        written = HashPIM_snapshot(sim, m, n, os.path.join(directory, 'round_{round:02d}.snap'))
+
+        assert(len(written) == Rnd)
+        assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+        # Resume from the snapshot of round 19 (with either memory backend), reaching the same hash values and counters
+        for resume_backend in MemoryBackend:
+            resumed = HashPIM_resume(written[19], m, n, device, resume_backend)
+            assert(resumed.readDigests(digest, as_hex=True) == hash_value)
+            assert((resumed.latency, resumed.energy, resumed.time_ns) == (sim.latency, sim.energy, sim.time_ns))
+
+        # Bisect the last round: a snapshot after each of its steps, each diffed against the reference step (the
+        # writer observes the run alongside a profiler and a state checker)
+        prepared, _ = Simulator.fromSnapshot(written[Rnd - 2], device, backend)
+        prepared.profiler = Profiler()
+        checker = StateChecker(prepared, first_round=Rnd - 1)
+        prepared.observers.append(checker)
+        latency = prepared.latency
+        steps = HashPIM_snapshot(prepared, m, n, os.path.join(directory, 'step_{round:02d}_{step}.snap'), steps=True,
+                                 first_round=Rnd - 1)
+
+        assert(prepared.observers == [checker] and checker.round == Rnd and checker.mismatches == [])
+        assert(sum(entry['cycles'] for entry in prepared.profiler.totals['step'].values()) == prepared.latency - latency)
+
+        states = toLanes(Simulator.fromSnapshot(written[Rnd - 2], device)[0].readStates())
+        for path in steps:
+            snapshot, position = Simulator.fromSnapshot(path, device)
+            expected = STEPS[position['step']](states, position['round'])
+            states = toLanes(snapshot.readStates())
+            assert((expected == states).all())
+
+        print(f'Success with {len(written)} round snapshots of {os.path.getsize(written[0])} bytes each '
+              f'({sim.r + 1}x{sim.c + 1} cells), resumed from round 19 and bisected by step in round {Rnd - 1}\n')
+
+
+def testHashPIMTraceFile(r: int, digest: int, row: int = 1024, col: int = 1024, backend: MemoryBackend = MemoryBackend.BOOL,
+                         directory: str = None):
+    """
+    Tests the HashPIM algorithm exported to a binary trace file, replayed from the file on a prepared snapshot, and
+    diffed against the trace of another Rho step implementation
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param backend: the storage of the simulated memory
+    :param directory: the directory of the trace files (a temporary directory by default)
+    """
+
+    Rnd = 24
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (trace file): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    with tempfile.TemporaryDirectory() as temp:
+        directory = directory if directory is not None else temp
+        path = os.path.join(directory, 'HashPIM.trace')
+
+        sim = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        hash_value = loadMessages(sim, r, digest)
+
+        HashPIM_record(sim, m, n).save(path)
+
+        assert(sim.readDigests(digest, as_hex=True) == hash_value)
+
+        # Prepare a snapshot of new messages and the constants (a run from the round after the last only stores them)
+        prepared = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        hash_value = loadMessages(prepared, r, digest)
+        HashPIM(prepared, m, n, first_round=Rnd)
+        prepared.saveSnapshot(os.path.join(directory, 'prepared.snap'))
+
+        # Replay from the files only
+        replay_sim, _ = Simulator.fromSnapshot(os.path.join(directory, 'prepared.snap'), device, backend)
+        CompiledTrace.load(path, device).replay(replay_sim)
+
+        assert(replay_sim.readDigests(digest, as_hex=True) == hash_value)
+        assert((replay_sim.latency, replay_sim.energy, replay_sim.time_ns) == (sim.latency, sim.energy, sim.time_ns))
+
+        # The traces of two Rho step implementations first differ after the first cycle of the Rho step of the first
+        # round (both start by initializing the zero row)
+        other = HashPIM_crossbar(row, col, m, n, device, backend=backend)
+        HashPIM_record(other, m, n, rho=RhoStrategy.MASKED_SHIFTER).save(os.path.join(directory, 'masked.trace'))
+
+        dry = HashPIM_crossbar(row, col, m, n, device, dry_run=True)
+        dry.profiler = Profiler()
+        HashPIM(dry, m, n)
+
+        assert(diffTraces(path, path) is None)
+        index, cycle = diffTraces(path, os.path.join(directory, 'masked.trace'))
+        assert(cycle == dry.profiler.totals['step']['Theta']['cycles'] + 1)
+
+        print(f'Success with {sim.latency} cycles in {os.path.getsize(path)} bytes (the masked shifter trace differs from '
+              f'record {index}, in cycle {cycle})\n')
+
+
+def testHashPIMJIT(r: int, digest: int, row: int = 1024, col: int = 1024):
+    """
+    Tests the HashPIM algorithm replayed by the JIT-compiled kernel (see Kernel.py) against the tensor replay
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    """
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (JIT replay): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    sim = HashPIM_crossbar(row, col, m, n, device, backend=MemoryBackend.PACKED)
+    hash_value = loadMessages(sim, r, digest)
+    trace = HashPIM_record(sim, m, n)
+
+    # Replay the same messages with the tensor replay and the kernel (the first kernel replay includes its compilation)
+    messages = randomMessages(r, digest, N_u)
+    times = {}
+    memories = {}
+    for name, jit in [('tensor', False), ('JIT (first)', True), ('JIT', True)]:
+        replay_sim = HashPIM_crossbar(row, col, m, n, device, backend=MemoryBackend.PACKED, jit=jit)
+        hash_value = loadMessages(replay_sim, r, digest, messages)
+
+        start = time.perf_counter()
+        HashPIM(replay_sim, m, n, trace)
+        times[name] = time.perf_counter() - start
+
+        assert(replay_sim.readDigests(digest, as_hex=True) == hash_value)
+        assert((replay_sim.latency, replay_sim.energy) == (sim.latency, sim.energy))
+        memories[jit] = replay_sim.memory.words
+
+    assert(torch.equal(memories[False], memories[True]))
+
+    # The kernel checks that the outputs of the logic gates are initialized, before writing any output of the step
+    # (the output of the first partition is initialized, and that of the second is not)
+    uninitialized = HashPIM_crossbar(row, col, m, n, device, backend=MemoryBackend.PACKED, jit=True)
+    program = [ParallelOperation([Operation(GateType.INIT1, GateDirection.IN_ROW, [], [2])]),
+               ParallelOperation([Operation(GateType.OR, GateDirection.IN_ROW, [0, 1], [2]),
+                                  Operation(GateType.OR, GateDirection.IN_ROW, [n, n + 1], [n + 2])])]
+    try:
+        CompiledTrace(uninitialized, program).replay(uninitialized)
+        assert(False)
+    except AssertionError as error:
+        assert('uninitialized' in str(error))
+    assert(uninitialized.memory.unpack()[:row, 2].all())
+
+    print('Success with the same memory for both replays\n')
+    print('Results (24 rounds, including the constants):')
+    for name, seconds in times.items():
+        print(f'{name}: {seconds:.2f} s')
+    print()
+
+
+def testHashPIMJITGeometries(r: int, digest: int):
+    """
+    Tests the JIT-compiled replay (see testHashPIMJIT) on crossbar arrays with more columns than rows, and with more
+    rows than columns
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    """
+
+    for row, col in [(151, 1024), (1024, 99)]:
+        testHashPIMJIT(r, digest, row, col)
+
+
+def testHashPIMExecution(r: int, digest: int, row: int = 1024, col: int = 1024):
+    """
+    Tests the static analysis of the gate preconditions of HashPIM (see Preconditions.py), and its replay without the
+    runtime checks (Execution.FAST) against the checked replay
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    """
+
+    m = 72
+    n = 37
+
+    r_u, c_u = HashPIM_layout(row, col, m, n)
+
+    N_u = r_u * c_u
+
+    print(f'HashPIM (checked and fast execution): SHA3-{digest}')
+    print(f'Parameters: rows={row}, columns={col}, units={N_u}, r={r}, hash value size={digest}\n')
+
+    def crossbar(**kwargs):
+        return HashPIM_crossbar(row, col, m, n, device, **kwargs)
+
+    # Every implementation of the Rho step is proven
+    traces = {rho: HashPIM_record(crossbar(backend=MemoryBackend.PACKED), m, n, rho=rho) for rho in RhoStrategy}
+    start = time.perf_counter()
+    for rho, trace in traces.items():
+        trace.violations = analyze(trace)
+        assert(trace.violations == [])
+    analysis = (time.perf_counter() - start) / len(traces)
+
+    # A gate on an output that is not known to be initialized is reported, and stays checked in the fast replay
+    for init, violations in [(GateType.INIT1, 0), (GateType.INIT0, 1)]:
+        program = [ParallelOperation([Operation(init, GateDirection.IN_ROW, [], [2])]),
+                   ParallelOperation([Operation(GateType.OR, GateDirection.IN_ROW, [0, 1], [2])])]
+        trace = CompiledTrace(crossbar(), program)
+        assert(len(analyze(trace)) == violations)
+        for backend, jit in [(MemoryBackend.BOOL, False), (MemoryBackend.PACKED, False), (MemoryBackend.PACKED, True)]:
+            failed = False
+            try:
+                trace.replay(crossbar(backend=backend, jit=jit, execution=Execution.FAST))
+            except AssertionError:
+                failed = True
+            assert(failed == (violations == 1))
+
+    # The operations performed directly are checked in every execution mode
+    for backend in MemoryBackend:
+        failed = False
+        try:
+            crossbar(backend=backend, execution=Execution.FAST).perform(
+                ParallelOperation([Operation(GateType.OR, GateDirection.IN_ROW, [0, 1], [2])]))
+        except AssertionError:
+            failed = True
+        assert(failed)
+
+    # The fast replay reaches the same hash values and counters as the checked one
+    trace = traces[RhoStrategy.LOG_SHIFTER]
+    messages = randomMessages(r, digest, N_u)
+    times = {}
+    for backend in MemoryBackend:
+        for execution in Execution:
+            sim = crossbar(backend=backend, execution=execution)
+            hash_value = loadMessages(sim, r, digest, messages)
+
+            start = time.perf_counter()
+            HashPIM(sim, m, n, trace)
+            times[(backend.name, execution.name)] = time.perf_counter() - start
+
+            assert(sim.readDigests(digest, as_hex=True) == hash_value)
+            assert((sim.latency, sim.energy) == (trace.latency, trace.energy))
+
+    print('Success with all the gate preconditions proven\n')
+    print(f'Results (24 rounds, including the constants; the analysis takes {analysis:.2f} s per trace, once):')
+    for (backend, execution), seconds in times.items():
+        print(f'{backend} {execution}: {seconds:.2f} s')
+    print()
+
+
+def testHashPIMValidation(row: int = 1024, col: int = 1024):
+    """
+    Tests the validation of the parallel operations (the partitions of the operations of a parallel operation must be
+    disjoint), in each validation mode
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    """
+
+    m = 72
+    n = 37
+
+    print('HashPIM (validation of the parallel operations)')
+    print(f'Parameters: rows={row}, columns={col}\n')
+
+    def crossbar(**kwargs):
+        return HashPIM_crossbar(row, col, m, n, device, **kwargs)
+
+    # Two operations in the same column partition collide, and in neighbouring partitions do not
+    colliding = ParallelOperation([Operation(GateType.OR, GateDirection.IN_ROW, [0, 1], [2]),
+                                   Operation(GateType.OR, GateDirection.IN_ROW, [3, 4], [5])])
+    disjoint = ParallelOperation([Operation(GateType.OR, GateDirection.IN_ROW, [0, 1], [2]),
+                                  Operation(GateType.OR, GateDirection.IN_ROW, [n, n + 1], [n + 2])])
+
+    # The outputs are initialized before each operation, so that only the validation can reject it
+    def rejects(sim, parallelOp):
+        sim.perform(ParallelOperation([Operation(GateType.INIT1, GateDirection.IN_ROW, [], [2, 5, n + 2])]))
+        try:
+            sim.perform(parallelOp)
+        except AssertionError:
+            return True
+        return False
+
+    assert(rejects(crossbar(), colliding))
+    assert(not rejects(crossbar(), disjoint))
+
+    # An operation without addresses performs nothing, and collides with no other operation
+    empty = Operation(GateType.INIT0, GateDirection.IN_ROW, [], [], [0])
+    assert(not rejects(crossbar(), ParallelOperation([empty])))
+    assert(not rejects(crossbar(), ParallelOperation([empty] + disjoint.ops)))
+
+    # Validation.OFF never checks
+    assert(not rejects(crossbar(validate=Validation.OFF), colliding))
+
+    # Validation.FIRST_RUN checks the first run of a program only, for the simulators sharing its validated programs
+    sim = crossbar(validate=Validation.FIRST_RUN)
+    sim.beginProgram('disjoint')
+    assert(not rejects(sim, disjoint))
+    sim.endProgram()
+    sim.beginProgram('disjoint')
+    assert(not rejects(sim, colliding))
+    sim.endProgram()
+
+    # Another simulator (or geometry) starts without validated programs, unless given the same set
+    assert(sim.validated_programs == {('disjoint', tuple(sim.row_partition_starts), tuple(sim.col_partition_starts), sim.r, sim.c)})
+    other = crossbar(validate=Validation.FIRST_RUN)
+    other.beginProgram('disjoint')
+    assert(rejects(other, colliding))
+    shared = crossbar(validate=Validation.FIRST_RUN, validated=sim.validated_programs)
+    shared.beginProgram('disjoint')
+    assert(not rejects(shared, colliding))
+
+    # Outside of a program, FIRST_RUN always checks
+    assert(rejects(crossbar(validate=Validation.FIRST_RUN), colliding))
+
+    print('Success with all the validation modes\n')
+
+
+def testHashPIMSweep(rows: list, cols: list, top: int = 10, path: str = None):
+    """
+    Sweeps crossbar geometries, rates and gate technologies, and prints the best configurations by throughput per area
+    :param rows: the numbers of memristive rows of the crossbar array (must include 1024)
+    :param cols: the numbers of memristive columns of the crossbar array (must include 1024)
+    :param top: the number of configurations printed
+    :param path: a .csv file to write the ranked table to
+    """
+
+    # MAGIC gates, and a slower, lower-energy gate technology
+    technologies = [MAGIC, Technology('slow', delay=6, energy=3.2)]
+
+    print('HashPIM (sweep)')
+    print(f'Parameters: rows={rows}, columns={cols}, technologies={[technology.name for technology in technologies]}\n')
+
+    table = HashPIM_sweep(rows, cols, technologies=technologies, path=path)
+
+    # The results of the README for r=1088 (SHA3-256) on a single 1024x1024 crossbar array
+    entry = next(entry for entry in table if (entry['row'], entry['col'], entry['r'], entry['technology']) == (1024, 1024, 1088, 'MAGIC'))
+    assert(entry['cycles'] == 3494 and entry['switchings'] == 119571)
+    assert(round(entry['tput_system'], 1) == 39.2 and round(entry['tput_power']) == 1422 and round(entry['tput_area']) == 9354)
+
+    print(f'Success with {len(table)} configurations\n')
+    print(f'Results (top {top} by Tput/Area):')
+    print(f'{"Rows":>6} {"Cols":>6} {"Units":>6} {"r":>6} {"Technology":>10} {"f (MHz)":>8} {"Cycles":>7} {"Tput (Gbps)":>12} '
+          f'{"Power (W)":>10} {"Tput/Power (Gbps/W)":>20} {"Tput/Area (bps/F^2)":>20}')
+    for entry in table[:top]:
+        print(f'{entry["row"]:>6} {entry["col"]:>6} {entry["units"]:>6} {entry["r"]:>6} {entry["technology"]:>10} {entry["f"]:>8.0f} '
+              f'{entry["cycles"]:>7} {entry["tput_system"]:>12.1f} {entry["power_system"]:>10.4f} '
+              f'{entry["tput_power"]:>20.0f} {entry["tput_area"]:>20.0f}')
+    print()
+
+
+def testHashPIMChip(r: int, sizes: list, loads: list = (0.1, 0.5, 0.8, 0.95, 1.2), messages: int = 100000,
+                    N_XB: int = 1):
+    """
+    Simulates a chip of 1024x1024 crossbar arrays hashing a stream of messages (see Chip.py), and prints the sustained
+    throughput, unit utilization and tail latency for several offered loads
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param sizes: the message size distribution, as (bytes, weight) pairs
+    :param loads: the offered loads, as fractions of the saturation throughput of the distribution
+    :param messages: the number of simulated messages at each load
+    :param N_XB: the number of crossbar arrays
+    """
+
+    print(f'HashPIM (chip): r={r}')
+    print(f'Parameters: crossbars={N_XB}, messages={messages}, sizes={sizes}\n')
+
+    costs = chipCosts(r)
+    units = costs['units']
+
+    # A stream of one-block messages saturates at a slot of read, load and permutation per message of each unit (but
+    # for a few of the 100 slots at the ends of the arrivals: the first one starts on the first arrival)
+    length = r // 8 - 1
+    expected = length * 8 * units * N_XB / (costs['read'] + costs['load'] + costs['permutation'])
+    saturated = HashPIM_chip(r, 2 * expected / (length * 8) * 1e9, [(length, 1)], messages=100 * units * N_XB, N_XB=N_XB)
+    assert(abs(saturated['throughput'] / expected - 1) < 0.05)
+    assert(saturated['throughput'] < saturated['peak'] < saturated['readme'])
+
+    # The saturation throughput of the distribution, by the blocks of each message
+    mean_bytes = sum(size * weight for size, weight in sizes) / sum(weight for _, weight in sizes)
+    mean_blocks = sum((size // (r // 8) + 1) * weight for size, weight in sizes) / sum(weight for _, weight in sizes)
+    capacity = mean_bytes * 8 * units * N_XB / (mean_blocks * (costs['permutation'] + costs['absorb']))
+
+    print(f'Success with {saturated["throughput"]:.3f} Gbps for saturated one-block messages\n')
+    print(f'Results (peak {saturated["peak"]:.3f} Gbps, README formula {saturated["readme"]:.1f} Gbps):')
+    print(f'{"Load":>6} {"Offered (Gbps)":>15} {"Tput (Gbps)":>12} {"Utilization":>12} {"Mean (us)":>10} {"p50 (us)":>10} '
+          f'{"p99 (us)":>10} {"p99.9 (us)":>11} {"Queueing (us)":>14}')
+    for load in loads:
+        result = HashPIM_chip(r, load * capacity / (mean_bytes * 8) * 1e9, sizes, messages=messages, N_XB=N_XB)
+        assert(result['throughput'] <= result['offered'] * 1.05 and result['utilization'] <= 1)
+        print(f'{load:>6.2f} {result["offered"]:>15.3f} {result["throughput"]:>12.3f} {result["utilization"]:>12.3f} '
+              f'{result["latency"]:>10.0f} {result["p50"]:>10.0f} {result["p99"]:>10.0f} {result["p999"]:>11.0f} '
+              f'{result["queueing"]:>14.0f}')
+    print()
+
+
+def testHashPIMConformance(batches: int = 1, seed: int = 0, row: int = 1024, col: int = 1024, max_blocks: int = 2,
+                           processes: int = None, backend: MemoryBackend = MemoryBackend.PACKED):
+    """
+    Tests the HashPIM algorithm against hashlib for all the SHA-3 variants, with seeded crossbar batches of edge-case
+    and random length messages run in a pool of processes
+    :param batches: the number of crossbar batches of each variant
+    :param seed: the seed of the first batch
+    :param row: the number of memristive rows in the crossbar array
+    :param col: the number of memristive columns in the crossbar array
+    :param max_blocks: the maximal number of blocks of a message
+    :param processes: the number of processes (default: the number of CPUs)
+    :param backend: the storage of the simulated memory
+    """
+
+    print('HashPIM (conformance): SHA3-224/256/384/512')
+    print(f'Parameters: rows={row}, columns={col}, batches={batches}, seed={seed}, blocks<={max_blocks}\n')
+
+    summary, wall_time = HashPIM_conformance(batches=batches, seed=seed, row=row, col=col, max_blocks=max_blocks,
+                                             backend=backend, processes=processes)
+
+    print(f'{"Variant":<10} {"Hashes":>10} {"Failures":>10} {"Hashes/s":>10}')
+    for digest, entry in summary.items():
+        result = 'PASS' if not entry['failures'] else 'FAIL'
+        print(f'SHA3-{digest:<5} {entry["hashes"]:>10} {len(entry["failures"]):>10} '
+              f'{entry["hashes"] / entry["time"]:>10.2f} {result}')
+        for batch_seed, unit, length in entry['failures'][:10]:
+            print(f'    seed={batch_seed} unit={unit} length={length} bytes')
+
+    hashes = sum(entry['hashes'] for entry in summary.values())
+    print(f'\nTotal: {hashes} hashes in {wall_time:.1f} s ({hashes / wall_time:.2f} hashes/s)\n')
+
+    assert(all(not entry['failures'] for entry in summary.values()))
+
+
+def randomMessages(r: int, digest: int, count: int):
+    """
+    Constructs random messages, each limited to r-4 bits (and to bytes for compatability with Cryptodome) and
+    padded by the SHA-3 padding rule to a single Keccak-f state
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param count: the number of messages
+    :return: the padded messages, a (count, b) tensor, and the expected hash value of each message
+    """
+
+    b = 1600
+
+    hash_function = {224: SHA3_224, 256: SHA3_256, 384: SHA3_384, 512: SHA3_512}[digest]
+    message_padded = torch.zeros(size=(count, b), dtype=torch.bool, device=device)
+    hash_value = []
+
+    for i in range(count):
+        message_len = random.randrange(0, r-4, 8)
+        message_in_bytes = bytes(random.getrandbits(8) for _ in range(message_len // 8))
+        hash_value.append(hash_function.new(message_in_bytes).hexdigest())
+
+        # Padding rule, to a single block followed by the zero capacity
+        message_padded[i][:r] = torch.from_numpy(padBlocks(message_in_bytes, r, 1)[0][0])
+
+    return message_padded, hash_value
+
+
+def loadMessages(sim: Simulator, r: int, digest: int, messages: tuple = None):
+    """
+    Loads a random message (see randomMessages) as the initial state of each SHA-3 unit of a crossbar array (see
+    HashPIM_crossbar)
+    :param sim: the simulation environment
+    :param r: the SHA-3 rate = {1152,1088,832,576}
+    :param digest: the SHA-3 hash value size = {224,256,384,512}
+    :param messages: the padded messages and hash values to load instead (e.g., to load the same messages into several
+        crossbar arrays)
+    :return: the expected hash value of each message
+    """
+
+    r_u = len(sim.row_partition_sizes) - 1
+    c_u = len(sim.col_partition_sizes) - 1
+
+    message_padded, hash_value = messages if messages is not None else randomMessages(r, digest, r_u * c_u)
+    sim.loadStates(message_padded.reshape(r_u, c_u, -1))
+    return hash_value
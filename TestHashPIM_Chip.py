@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Chip():
+    """
+    Simulates a 1024x1024 crossbar array hashing a stream of SHA3-256 messages of 64 B to 4 KiB under increasing load
+    """
+
+    r = 1088
+    sizes = [(64, 50), (136, 30), (1024, 15), (4096, 5)]
+
+    testHashPIMChip(r, sizes)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Chip()
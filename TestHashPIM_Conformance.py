@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Conformance():
+    """
+    Tests the HashPIM algorithm against hashlib for all the SHA-3 variants
+    """
+
+    batches = 1
+    seed = 0
+
+    testHashPIMConformance(batches, seed)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Conformance()
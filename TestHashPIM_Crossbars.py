@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Crossbars():
+    """
+    Tests the HashPIM algorithm for SHA3-256 on two crossbar arrays at once
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMCrossbars(r, digest, crossbars=2)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Crossbars()
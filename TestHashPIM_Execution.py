@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Execution():
+    """
+    Tests the HashPIM algorithm for SHA3-256 with the gate preconditions proven statically, in checked and fast execution
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMExecution(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Execution()
@@ -0,0 +1,16 @@
+from TestHashPIM import *
+
+def testHashPIM_JIT():
+    """
+    Tests the HashPIM algorithm for SHA3-256 replayed by the JIT-compiled kernel, on square and non-square crossbars
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMJIT(r, digest)
+    testHashPIMJITGeometries(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_JIT()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Optimize():
+    """
+    Tests the HashPIM algorithm for SHA3-256 after removing its redundant initializations
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMOptimize(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Optimize()
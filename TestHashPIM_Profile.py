@@ -0,0 +1,19 @@
+from TestHashPIM import *
+
+def testHashPIM_Profile():
+    """
+    Profiles the HashPIM algorithm for SHA3-256, by step, primitive and gate type
+    """
+
+    r = 1088
+    digest = 256
+
+    # The cycles and switchings of the 1024x1024 crossbar array
+    testHashPIMProfile(r, digest)
+
+    # The simulation time of a smaller crossbar array
+    testHashPIMProfile(r, digest, row=151, col=99, dry_run=False)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Profile()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Reference():
+    """
+    Tests the HashPIM algorithm for SHA3-256 step by step against the reference Keccak-f
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMReference(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Reference()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Rho():
+    """
+    Tests the HashPIM algorithm for SHA3-256 with each implementation of the Rho step
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMRho(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Rho()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_SHAKE128():
+    """
+    Tests the HashPIM algorithm for SHAKE128 with 512-byte outputs
+    """
+
+    d = 128
+    output_bits = 4096
+
+    testHashPIMShake(d, output_bits)
+    
+
+if __name__ == "__main__":
+    testHashPIM_SHAKE128()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_SHAKE256():
+    """
+    Tests the HashPIM algorithm for SHAKE256 with 512-byte outputs
+    """
+
+    d = 256
+    output_bits = 4096
+
+    testHashPIMShake(d, output_bits)
+    
+
+if __name__ == "__main__":
+    testHashPIM_SHAKE256()
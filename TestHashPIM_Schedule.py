@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Schedule():
+    """
+    Tests the HashPIM algorithm for SHA3-256 after packing its operations into fewer cycles
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMSchedule(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Schedule()
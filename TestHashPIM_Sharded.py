@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Sharded():
+    """
+    Tests the HashPIM algorithm for SHA3-256 on 2x2 groups of SHA-3 units, simulated in parallel worker processes
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMSharded(r, digest, row_groups=2, col_groups=2)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Sharded()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Snapshot():
+    """
+    Tests the HashPIM algorithm for SHA3-256 with a snapshot after every round, resuming from the snapshots
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMSnapshot(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Snapshot()
@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Sponge():
+    """
+    Tests the HashPIM algorithm for SHA3-256 on messages of up to 3 blocks
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMSponge(r, digest, max_blocks=3)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Sponge()
@@ -0,0 +1,14 @@
+from TestHashPIM import *
+
+def testHashPIM_Sweep():
+    """
+    Sweeps the crossbar geometries of 256 to 2048 rows and columns, for all the SHA-3 rates
+    """
+
+    sizes = [256, 512, 1024, 2048]
+
+    testHashPIMSweep(sizes, sizes)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Sweep()
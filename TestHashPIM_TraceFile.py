@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_TraceFile():
+    """
+    Tests the HashPIM algorithm for SHA3-256 replayed from a binary trace file
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMTraceFile(r, digest)
+    
+
+if __name__ == "__main__":
+    testHashPIM_TraceFile()
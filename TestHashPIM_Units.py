@@ -0,0 +1,15 @@
+from TestHashPIM import *
+
+def testHashPIM_Units():
+    """
+    Tests the HashPIM algorithm for SHA3-256 on a unit-level simulation of 4096 SHA-3 units
+    """
+
+    r = 1088
+    digest = 256
+
+    testHashPIMUnits(r, digest, batch=4096)
+    
+
+if __name__ == "__main__":
+    testHashPIM_Units()
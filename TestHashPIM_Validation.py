@@ -0,0 +1,12 @@
+from TestHashPIM import *
+
+def testHashPIM_Validation():
+    """
+    Tests the validation of the parallel operations of HashPIM in each validation mode
+    """
+
+    testHashPIMValidation()
+    
+
+if __name__ == "__main__":
+    testHashPIM_Validation()
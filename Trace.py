@@ -0,0 +1,291 @@
+import torch
+import numpy as np
+import json
+from typing import List
+from simulator import Simulator, ParallelOperation, GateType, GateDirection, Execution
+from Preconditions import analyze
+
+
+# The record of each gate in a trace file (see CompiledTrace.save): its cycle, gate type, direction and mask (-1 for
+# all the rows/columns), and its input and output addresses (-1 for the inputs of an initialization, and input1 repeats
+# input0 for NOT). A record per output address of an initialization.
+TRACE_RECORD = np.dtype([('cycle', '<u4'), ('gate', 'u1'), ('direction', 'u1'), ('mask', '<i4'),
+                         ('input0', '<i4'), ('input1', '<i4'), ('output', '<i4')])
+
+# The trace file format: the magic bytes, the length of the JSON header (8 bytes, little endian), the header, then the
+# records, the offsets of the masks into the mask addresses (int64) and the mask addresses (int32), each at a
+# 64-byte aligned offset
+TRACE_MAGIC = b'XBTRACE1'
+
+
+def alignedOffsets(start: int, sizes: list):
+    """
+    :return: the 64-byte aligned offset of each of the consecutive sections of the given sizes, and the total size
+    """
+    offsets = []
+    for size in sizes:
+        start = -(-start // 64) * 64
+        offsets.append(start)
+        start += size
+    return offsets, start
+
+
+def readTrace(path: str):
+    """
+    Opens a trace file (see CompiledTrace.save) without loading it
+    :param path: the trace file
+    :return: the header, and read-only memory maps of the records, the mask offsets and the mask addresses
+    """
+
+    with open(path, 'rb') as f:
+        assert(f.read(len(TRACE_MAGIC)) == TRACE_MAGIC)
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length))
+
+    counts = [header['records'], header['masks'] + 1, header['mask_addresses']]
+    dtypes = [TRACE_RECORD, np.dtype('<i8'), np.dtype('<i4')]
+    offsets, _ = alignedOffsets(len(TRACE_MAGIC) + 8 + length, [count * dtype.itemsize for count, dtype in zip(counts, dtypes)])
+    return header, *[np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+                     for dtype, offset, count in zip(dtypes, offsets, counts)]
+
+
+def diffTraces(first: str, second: str):
+    """
+    Compares the programs of two trace files
+    :param first: the first trace file
+    :param second: the second trace file
+    :return: None if the programs are the same, otherwise the index and cycle of the first differing record (in the
+        first trace, or its end)
+    """
+
+    header, records, mask_ptr, mask_addresses = readTrace(first)
+    other_header, other_records, other_mask_ptr, other_mask_addresses = readTrace(second)
+
+    # The mask IDs are only compared by their addresses
+    masks = [tuple(mask_addresses[mask_ptr[i]:mask_ptr[i + 1]]) for i in range(header['masks'])]
+    other_masks = [tuple(other_mask_addresses[other_mask_ptr[i]:other_mask_ptr[i + 1]]) for i in range(other_header['masks'])]
+    same_masks = np.array([other_masks.index(mask) if mask in other_masks else -2 for mask in masks] + [-1])
+
+    n = min(len(records), len(other_records))
+    fields = [name for name in TRACE_RECORD.names if name != 'mask']
+    differs = np.zeros(n, dtype=bool)
+    for name in fields:
+        differs |= records[name][:n] != other_records[name][:n]
+    differs |= same_masks[records['mask'][:n]] != other_records['mask'][:n]
+
+    if differs.any():
+        index = int(np.argmax(differs))
+    elif len(records) != len(other_records) or header['r'] != other_header['r'] or header['c'] != other_header['c']:
+        index = n
+    else:
+        return None
+    return index, int(records['cycle'][index]) if index < len(records) else header['latency']
+
+
+class CompiledTrace:
+    """
+    Represents a recorded sequence of parallel operations, compiled into flat tensors that can be replayed
+    on any crossbar with the same geometry without constructing Operation objects
+    """
+
+    def __init__(self, sim: Simulator, parallelOps: List[ParallelOperation]):
+        """
+        Compiles the given parallel operations. Each parallel operation (one cycle) is lowered into one step
+        per (gate type, mask) group among its operations (see Simulator.fuse).
+        :param sim: the simulator the operations were recorded on (used for the geometry and the energy model)
+        :param parallelOps: the recorded parallel operations, in execution order
+        """
+
+        self.r = sim.r
+        self.c = sim.c
+        self.device = sim.device
+
+        # The masks, interned once each
+        self.masks = []
+        mask_ids = {}
+
+        cycles = []
+        gates = []
+        directions = []
+        step_masks = []
+        inputs = []
+        outputs = []
+        in_ptr = [0]
+        out_ptr = [0]
+
+        # The latency and energy, also in ns and fJ for the technology of the simulator (see Simulator.perform)
+        self.energy = 0
+        self.time_ns = 0.0
+        self.energy_fJ = 0.0
+        for cycle, parallelOp in enumerate(parallelOps):
+            delay = 0
+            for gateType, gateDirection, step_inputs, step_outputs, mask in sim.fuse(parallelOp):
+                key = tuple(mask) if mask is not None else None
+                if key not in mask_ids:
+                    mask_ids[key] = -1 if key is None else len(self.masks)
+                    if key is not None:
+                        self.masks.append(sim.maskTensor(mask))
+
+                inputs.extend(step_inputs)
+                outputs.extend(step_outputs)
+                cycles.append(cycle)
+                gates.append(gateType.value)
+                directions.append(gateDirection.value)
+                step_masks.append(mask_ids[key])
+                in_ptr.append(len(inputs))
+                out_ptr.append(len(outputs))
+                gates_energy = sim.gatesEnergy(gateType, gateDirection, len(step_outputs), mask)
+                self.energy += gates_energy
+                self.energy_fJ += gates_energy * sim.technology.gateEnergy(gateType)
+                delay = max(delay, sim.technology.gateDelay(gateType))
+            self.time_ns += delay
+
+        self.latency = len(parallelOps)
+
+        # The lowered program of the JIT-compiled replay kernel (see Kernel.py), on its first use
+        self.kernel = None
+
+        # The violations of the gate preconditions (see Preconditions.analyze), on the first Execution.FAST replay
+        self.violations = None
+
+        self.cycles = torch.tensor(cycles, dtype=torch.int32)
+        self.gates = torch.tensor(gates, dtype=torch.int8)
+        self.directions = torch.tensor(directions, dtype=torch.int8)
+        self.mask_ids = torch.tensor(step_masks, dtype=torch.int32)
+        self.in_ptr = torch.tensor(in_ptr, dtype=torch.long)
+        self.out_ptr = torch.tensor(out_ptr, dtype=torch.long)
+        self.inputs = torch.tensor(inputs, dtype=torch.long, device=self.device).reshape(-1, 2)
+        self.outputs = torch.tensor(outputs, dtype=torch.long, device=self.device)
+
+    def save(self, path: str):
+        """
+        Exports the trace as a binary file of gate records (see TRACE_RECORD and TRACE_MAGIC), with the counters of the
+        recorded run in its header
+        :param path: the trace file
+        """
+
+        in_ptr = self.in_ptr.numpy()
+        out_ptr = self.out_ptr.numpy()
+        num_inputs = np.diff(in_ptr)
+        num_outputs = np.diff(out_ptr)
+
+        # Each logic step has a single output per gate (see Simulator.fuse), and an initialization has no inputs
+        assert(((num_inputs == num_outputs) | (num_inputs == 0)).all())
+
+        records = np.zeros(len(self.outputs), dtype=TRACE_RECORD)
+        records['cycle'] = np.repeat(self.cycles.numpy(), num_outputs)
+        records['gate'] = np.repeat(self.gates.numpy(), num_outputs)
+        records['direction'] = np.repeat(self.directions.numpy(), num_outputs)
+        records['mask'] = np.repeat(self.mask_ids.numpy(), num_outputs)
+        records['output'] = self.outputs.cpu().numpy()
+
+        has_inputs = np.repeat(num_inputs > 0, num_outputs)
+        inputs = self.inputs.cpu().numpy()
+        records['input0'] = -1
+        records['input1'] = -1
+        records['input0'][has_inputs] = inputs[:, 0]
+        records['input1'][has_inputs] = inputs[:, 1]
+
+        masks = [mask.cpu().numpy() for mask in self.masks]
+        mask_ptr = np.cumsum([0] + [len(mask) for mask in masks]).astype('<i8')
+        mask_addresses = np.concatenate(masks + [np.zeros(0, dtype=np.int64)]).astype('<i4')
+
+        header = json.dumps({'r': self.r, 'c': self.c, 'latency': self.latency, 'energy': self.energy,
+                             'time_ns': self.time_ns, 'energy_fJ': self.energy_fJ, 'records': len(records),
+                             'masks': len(masks), 'mask_addresses': len(mask_addresses)}).encode()
+        sections = [records, mask_ptr, mask_addresses]
+        offsets, size = alignedOffsets(len(TRACE_MAGIC) + 8 + len(header), [section.nbytes for section in sections])
+
+        with open(path, 'wb') as f:
+            f.write(TRACE_MAGIC + len(header).to_bytes(8, 'little') + header)
+            f.truncate(size)
+        for section, offset in zip(sections, offsets):
+            data = np.memmap(path, dtype=section.dtype, mode='r+', offset=offset, shape=section.shape)
+            data[:] = section
+            data.flush()
+
+    @staticmethod
+    def load(path: str, device: torch.device):
+        """
+        Loads a trace file (see save) straight from its memory map: the records are grouped into the steps of the
+        compiled trace with array operations, without constructing any operation objects
+        :param path: the trace file
+        :param device: The device (e.g., CPU, GPU) the trace is replayed on
+        :return: the compiled trace, with the counters of the recorded run
+        """
+
+        header, records, mask_ptr, mask_addresses = readTrace(path)
+
+        trace = CompiledTrace.__new__(CompiledTrace)
+        trace.r, trace.c, trace.device = header['r'], header['c'], device
+        trace.kernel = None
+        trace.violations = None
+        trace.latency, trace.energy = header['latency'], header['energy']
+        trace.time_ns, trace.energy_fJ = header['time_ns'], header['energy_fJ']
+        trace.masks = [torch.from_numpy(mask_addresses[mask_ptr[i]:mask_ptr[i + 1]].astype(np.int64)).to(device)
+                       for i in range(header['masks'])]
+
+        # A step starts at each change of the cycle, gate type, direction or mask
+        keys = np.stack([records['cycle'].astype(np.int64), records['gate'], records['direction'], records['mask']])
+        starts = np.flatnonzero(np.concatenate([[True], (keys[:, 1:] != keys[:, :-1]).any(axis=0)]))
+
+        has_inputs = records['input0'] >= 0
+        trace.cycles = torch.from_numpy(records['cycle'][starts].astype(np.int32))
+        trace.gates = torch.from_numpy(records['gate'][starts].astype(np.int8))
+        trace.directions = torch.from_numpy(records['direction'][starts].astype(np.int8))
+        trace.mask_ids = torch.from_numpy(records['mask'][starts].astype(np.int32))
+        trace.out_ptr = torch.from_numpy(np.append(starts, len(records)).astype(np.int64))
+        trace.in_ptr = torch.from_numpy(np.concatenate([[0], np.cumsum(has_inputs)])[trace.out_ptr.numpy()])
+        trace.inputs = torch.from_numpy(np.stack([records['input0'][has_inputs], records['input1'][has_inputs]], axis=-1)
+                                        .astype(np.int64)).to(device)
+        trace.outputs = torch.from_numpy(records['output'].astype(np.int64)).to(device)
+        return trace
+
+    def __len__(self):
+        """
+        :return: the number of compiled steps
+        """
+        return len(self.gates)
+
+    def replay(self, sim: Simulator):
+        """
+        Replays the trace on the given crossbar, and charges its precomputed latency and energy. With Execution.FAST,
+        the gates of the trace are first analyzed (once per trace), and only the steps that are not proven to
+        initialize their outputs are checked at runtime.
+        :param sim: the simulation environment (with the same geometry as the recorded one)
+        """
+
+        assert(sim.r == self.r and sim.c == self.c)
+
+        if sim.dry_run:
+            sim.charge(self.latency, self.energy, self.time_ns, self.energy_fJ)
+            return
+
+        # The steps that are checked at runtime
+        checks = np.ones(len(self.gates), dtype=bool)
+        if sim.execution == Execution.FAST:
+            if self.violations is None:
+                self.violations = analyze(self)
+            checks[:] = False
+            checks[[violation['step'] for violation in self.violations]] = True
+
+        if sim.jit:
+            if self.kernel is None:
+                from Kernel import KernelProgram
+                self.kernel = KernelProgram(self, sim.r, sim.c)
+            for memory in sim.activeMemories():
+                self.kernel.run(memory, checks)
+            sim.charge(self.latency, self.energy, self.time_ns, self.energy_fJ)
+            return
+
+        gate_types = list(GateType)
+        gate_directions = list(GateDirection)
+
+        in_ptr = self.in_ptr.tolist()
+        out_ptr = self.out_ptr.tolist()
+        for s, (gate, direction, mask_id) in enumerate(zip(self.gates.tolist(), self.directions.tolist(), self.mask_ids.tolist())):
+            sim.performGates(gate_types[gate], gate_directions[direction],
+                             self.inputs[in_ptr[s]:in_ptr[s + 1]], self.outputs[out_ptr[s]:out_ptr[s + 1]],
+                             self.masks[mask_id] if mask_id >= 0 else None, bool(checks[s]))
+
+        sim.charge(self.latency, self.energy, self.time_ns, self.energy_fJ)
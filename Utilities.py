@@ -1,6 +1,8 @@
 from simulator import Simulator, ParallelOperation, Operation, GateType, GateDirection
+from Profiler import primitive
 
 
+@primitive
 def XOR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel XOR on numbers stored in indices a and b, storing the result in b.
@@ -27,6 +29,7 @@ def XOR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, ma
             [sim.relToAbsRow(j, a), sim.relToAbsRow(j, b)], [sim.relToAbsRow(j, c)], mask) for j in range(sim.kr)]))
 
 
+@primitive
 def OR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel OR on numbers stored in indices a and b, storing the result in b.
@@ -47,6 +50,7 @@ def OR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, mas
             [sim.relToAbsRow(j, a), sim.relToAbsRow(j, b)], [sim.relToAbsRow(j, c)], mask) for j in range(sim.kr)]))
 
 
+@primitive
 def NOR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel NOR on numbers stored in indices a and b, storing the result in b.
@@ -67,6 +71,7 @@ def NOR(sim: Simulator, a: int, b: int, c: int, gateDirection: GateDirection, ma
             [sim.relToAbsRow(j, a), sim.relToAbsRow(j, b)], [sim.relToAbsRow(j, c)], mask) for j in range(sim.kr)]))
 
 
+@primitive
 def NOT(sim: Simulator, a: int, c: int, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel NOT on numbers stored in indices a, storing the result in c.
@@ -86,6 +91,7 @@ def NOT(sim: Simulator, a: int, c: int, gateDirection: GateDirection, mask=None)
             [sim.relToAbsRow(j, a)], [sim.relToAbsRow(j, c)], mask) for j in range(sim.kr)]))
 
 
+@primitive
 def MUX2(sim: Simulator, a: int, b: int, sel: int, selN: int, c: int, intermediates: list, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel MUX on numbers stored in indices a, b and sel, storing the result in c.
@@ -121,6 +127,7 @@ def MUX2(sim: Simulator, a: int, b: int, sel: int, selN: int, c: int, intermedia
             [sim.relToAbsRow(j, intermediates[0]), sim.relToAbsRow(j, intermediates[1])], [sim.relToAbsRow(j, c)], mask) for j in range(sim.kr)]))
 
 
+@primitive
 def INIT0(sim: Simulator, a: list, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel INIT0 storing the result in a.
@@ -132,13 +139,14 @@ def INIT0(sim: Simulator, a: list, gateDirection: GateDirection, mask=None):
 
     if (gateDirection == gateDirection.IN_ROW):
         sim.perform(ParallelOperation([Operation(GateType.INIT0, GateDirection.IN_ROW, [],
-            sum([[sim.relToAbsCol(j, i) for i in a] for j in range(sim.kc)], []), mask)]))
+            [sim.relToAbsCol(j, i) for j in range(sim.kc) for i in a], mask)]))
 
     else:
         sim.perform(ParallelOperation([Operation(GateType.INIT0, GateDirection.IN_COLUMN, [],
-            sum([[sim.relToAbsRow(j, i) for i in a] for j in range(sim.kr)], []), mask)]))
+            [sim.relToAbsRow(j, i) for j in range(sim.kr) for i in a], mask)]))
 
 
+@primitive
 def INIT1(sim: Simulator, a: list, gateDirection: GateDirection, mask=None):
     """
     Performs a row/col-parallel INIT1 storing the result in a.
@@ -150,8 +158,8 @@ def INIT1(sim: Simulator, a: list, gateDirection: GateDirection, mask=None):
 
     if (gateDirection == gateDirection.IN_ROW):
         sim.perform(ParallelOperation([Operation(GateType.INIT1, GateDirection.IN_ROW, [],
-            sum([[sim.relToAbsCol(j, i) for i in a] for j in range(sim.kc)], []), mask)]))
+            [sim.relToAbsCol(j, i) for j in range(sim.kc) for i in a], mask)]))
 
     else:
         sim.perform(ParallelOperation([Operation(GateType.INIT1, GateDirection.IN_COLUMN, [],
-            sum([[sim.relToAbsRow(j, i) for i in a] for j in range(sim.kr)], []), mask)]))
+            [sim.relToAbsRow(j, i) for j in range(sim.kr) for i in a], mask)]))
@@ -1,5 +1,10 @@
 import torch
-from typing import List
+import torch.multiprocessing as mp
+import numpy as np
+import json
+import time
+from typing import List, Sequence, Union
+from itertools import accumulate, chain
 from enum import Enum
 
 
@@ -25,6 +30,105 @@ class GateDirection(Enum):
     IN_COLUMN = 1
 
 
+class MemoryBackend(Enum):
+    """
+    Represents the storage of the crossbar memory
+    """
+
+    BOOL = 0
+    PACKED = 1
+
+
+class Validation(Enum):
+    """
+    Represents when the parallel operations are checked for partition collisions
+    """
+
+    FULL = 0
+    FIRST_RUN = 1
+    OFF = 2
+
+
+class Execution(Enum):
+    """
+    Represents whether the gates of a compiled trace check at runtime that their output cells are initialized (CHECKED),
+    or skip the check once the trace is proven statically (FAST, see Preconditions.py). The operations performed
+    directly (see Simulator.perform) are always checked.
+    """
+
+    CHECKED = 0
+    FAST = 1
+
+
+class Technology:
+    """
+    Represents the delay and switching energy of the stateful gates of a memristive technology
+    """
+
+    def __init__(self, name: str, delay: float, energy: float, gate_delays: dict = None, gate_energies: dict = None):
+        """
+        Constructs a technology model
+        :param name: the name of the technology
+        :param delay: the delay of a cycle (ns), for the gate types without a delay of their own and for writes
+        :param energy: the energy of a switching (fJ), for the gate types without an energy of their own and for writes
+        :param gate_delays: the delay (ns) of each gate type (e.g., {GateType.NOR: 3})
+        :param gate_energies: the energy of a switching (fJ) of each gate type (e.g., the initializations can differ from
+            the logic gates)
+        """
+        self.name = name
+        self.delay = delay
+        self.energy = energy
+        self.gate_delays = dict(gate_delays or {})
+        self.gate_energies = dict(gate_energies or {})
+
+    def gateDelay(self, gateType: GateType):
+        """
+        :return: the delay of the given gate type (ns)
+        """
+        return self.gate_delays.get(gateType, self.delay)
+
+    def gateEnergy(self, gateType: GateType):
+        """
+        :return: the energy of a switching of the given gate type (fJ)
+        """
+        return self.gate_energies.get(gateType, self.energy)
+
+
+# MAGIC gates (3ns delay, 6.4fJ energy)
+MAGIC = Technology('MAGIC', delay=3, energy=6.4)
+
+
+# The snapshot file format (see Simulator.saveSnapshot): the magic bytes, the length of the JSON header (8 bytes, little
+# endian), the header, and the cells bit-packed in row-major order (bit k of byte i holds cell 8*i+k) at a 64-byte
+# aligned offset
+SNAPSHOT_MAGIC = b'XBSNAP01'
+
+
+def readSnapshot(path: str):
+    """
+    Opens a snapshot file
+    :param path: the snapshot file
+    :return: the header, and a read-only memory map of the bit-packed cells
+    """
+
+    with open(path, 'rb') as f:
+        assert(f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC)
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length))
+    offset = -(-(len(SNAPSHOT_MAGIC) + 8 + length) // 64) * 64
+    return header, np.memmap(path, dtype=np.uint8, mode='r', offset=offset)
+
+
+def batchShape(batch):
+    """
+    :param batch: the number of crossbar copies, or the sizes of several batch dimensions, or None
+    :return: the sizes of the leading batch dimensions of the memory
+    """
+    if batch is None:
+        return ()
+    return tuple(batch) if isinstance(batch, (tuple, list)) else (batch,)
+
+
 class Operation:
     """
     Represent a single row/column operation
@@ -46,6 +150,11 @@ class Operation:
         self.outputs = outputs
         self.mask = mask
 
+        # The lowest and highest addresses, whose partitions bound the operation (see Simulator.checkCollisions),
+        # or None for an operation without addresses (which performs nothing)
+        addresses = list(chain(inputs, outputs))
+        self.span = (min(addresses), max(addresses)) if addresses else None
+
 
 class ParallelOperation:
     """
@@ -60,40 +169,283 @@ class ParallelOperation:
         self.ops = ops
 
 
+class PackedMemory:
+    """
+    Represents the crossbar memory bit-packed along the columns: bit (i % 64) of word [j, i // 64] holds cell (i, j).
+    IN_ROW gates (parallel along the rows) are word-wide bitwise operations, and IN_COLUMN gates operate on one bit
+    of each word. Indexing follows the boolean memory tensor it replaces.
+    """
+
+    def __init__(self, r: int, c: int, device: torch.device, batch: Union[int, Sequence[int]] = None):
+        """
+        Constructs a packed memory of (r+1)x(c+1) cells initialized to zero
+        :param r: the number of crossbar rows covered by an unmasked IN_ROW gate
+        :param c: the number of crossbar columns covered by an unmasked IN_COLUMN gate
+        :param device: The device (e.g., CPU, GPU) to utilize
+        :param batch: the number of crossbar copies (a leading batch dimension), or the sizes of several leading
+            batch dimensions, if any
+        """
+
+        self.r = r
+        self.c = c
+        self.batch = batchShape(batch)
+        self.shape = self.batch + (r + 1, c + 1)
+        self.device = device
+        self.words = torch.zeros(*self.batch, c + 1, (r + 64) // 64, dtype=torch.int64, device=device)
+
+        # The word with only bit i set, for each bit i
+        self.bits = torch.ones(64, dtype=torch.int64, device=device) << torch.arange(64, device=device)
+
+        self.all_rows = self.packRows(torch.arange(r, device=device))
+
+        # The packed row masks, by the identity of the mask tensor (which is kept alive alongside)
+        self.row_masks = {}
+
+    def packRows(self, rows: torch.LongTensor):
+        """
+        Packs a set of rows into a word mask
+        :param rows: the distinct row addresses
+        :return: the words with the bits of the given rows set
+        """
+        return torch.zeros(self.words.shape[-1], dtype=torch.int64, device=self.device).index_add_(0, rows // 64, self.bits[rows % 64])
+
+    def packedRowMask(self, mask: torch.LongTensor):
+        """
+        Packs a row mask, reusing the result for the same mask tensor
+        :param mask: the row addresses
+        :return: the words with the bits of the given rows set
+        """
+        cached = self.row_masks.get(id(mask))
+        if cached is None or cached[0] is not mask:
+            if len(self.row_masks) >= 1024:
+                self.row_masks.clear()
+            cached = (mask, self.packRows(torch.unique(mask)))
+            self.row_masks[id(mask)] = cached
+        return cached[1]
+
+    def crossbar(self, index: int):
+        """
+        :param index: the index along the batch dimension
+        :return: a packed memory that shares the words of a single crossbar copy
+        """
+        memory = PackedMemory.__new__(PackedMemory)
+        memory.__dict__.update(self.__dict__)
+        memory.batch = self.batch[1:]
+        memory.shape = self.shape[1:]
+        memory.words = self.words[index]
+        memory.row_masks = {}
+        return memory
+
+    def unpack(self):
+        """
+        :return: the memory as a boolean tensor
+        """
+        cells = ((self.words[..., None] & self.bits) != 0).reshape(*self.batch, self.c + 1, -1)
+        return cells[..., :self.r + 1].transpose(-1, -2).contiguous()
+
+    def pack(self, cells: torch.Tensor):
+        """
+        Overwrites the memory with the given cells
+        :param cells: a tensor of the cell values, of the shape of the memory
+        """
+        padded = torch.zeros(*self.batch, self.c + 1, self.words.shape[-1] * 64, dtype=torch.int64, device=self.device)
+        padded[..., :self.r + 1] = cells.transpose(-1, -2) != 0
+        self.words[...] = (padded.reshape(*self.batch, self.c + 1, -1, 64) * self.bits).sum(dim=-1)
+
+    @staticmethod
+    def cell(key):
+        """
+        :return: the (row, column) of a single-cell key, either (i, j) or (..., i, j), or None for other keys
+        """
+        if isinstance(key, tuple) and key[:1] == (Ellipsis,):
+            key = key[1:]
+        if isinstance(key, tuple) and len(key) == 2 and all(isinstance(k, int) for k in key):
+            return key
+        return None
+
+    def __getitem__(self, key):
+        if isinstance(key, int) and not self.batch:
+            return PackedLine(self, key)
+        if isinstance(key, int):
+            return self.crossbar(key)
+        cell = PackedMemory.cell(key)
+        if cell is not None and (not self.batch or key[0] is Ellipsis):
+            i, j = cell
+            return ((self.words[..., j, i // 64] >> (i % 64)) & 1).bool()
+        return self.unpack()[key]
+
+    def __setitem__(self, key, value):
+        cell = PackedMemory.cell(key)
+        if cell is not None and (not self.batch or key[0] is Ellipsis):
+            i, j = cell
+            bit = self.bits[i % 64]
+            self.words[..., j, i // 64] = (self.words[..., j, i // 64] & ~bit) | (bit if bool(value) else 0)
+            return
+        cells = self.unpack()
+        cells[key] = value
+        self.pack(cells)
+
+    def performGates(self, gateType: GateType, gateDirection: GateDirection, inputs: torch.LongTensor,
+                     outputs: torch.LongTensor, mask: torch.LongTensor = None, check: bool = True):
+        """
+        Performs several gates of the same type and direction (see Simulator.performGates)
+        """
+
+        if gateDirection == GateDirection.IN_ROW:
+
+            lines = self.packedRowMask(mask) if mask is not None else self.all_rows
+
+            if gateType == GateType.INIT0:
+                self.words[..., outputs, :] = self.words[..., outputs, :] & ~lines
+                return
+            if gateType == GateType.INIT1:
+                self.words[..., outputs, :] = self.words[..., outputs, :] | lines
+                return
+
+            a = self.words[..., inputs[:, 0], :]
+            b = self.words[..., inputs[:, 1], :]
+            current = self.words[..., outputs, :]
+
+        else:
+
+            lines = mask if mask is not None else slice(0, self.c)
+            words = self.words[..., lines, :]
+
+            if gateType == GateType.INIT0 or gateType == GateType.INIT1:
+                rows = self.packRows(outputs)
+                self.words[..., lines, :] = (words | rows) if gateType == GateType.INIT1 else (words & ~rows)
+                return
+
+            # Reads the bits of the inputs and outputs as 0 or -1 (all ones) words
+            addrs = torch.cat((inputs[:, 0], inputs[:, 1], outputs))
+            a, b, current = torch.chunk(-((words[..., addrs // 64] >> (addrs % 64)) & 1), 3, dim=-1)
+
+        if gateType == GateType.NOT:
+            result = torch.bitwise_not(a)
+        elif gateType == GateType.NOR:
+            result = torch.bitwise_not(torch.bitwise_or(a, b))
+        elif gateType == GateType.NAND:
+            result = torch.bitwise_not(torch.bitwise_and(a, b))
+        else:
+            result = torch.bitwise_or(a, b)
+
+        if gateDirection == GateDirection.IN_ROW:
+            if check and gateType != GateType.NAND:
+                assert(((~current) & lines).eq(0).all())
+            self.words[..., outputs, :] = torch.bitwise_and(current, torch.bitwise_or(result, ~lines))
+        else:
+            if check and gateType != GateType.NAND:
+                assert((current == -1).all())
+            values = torch.bitwise_and(current, result) & self.bits[outputs % 64]
+            self.words[..., lines, :] = (words & ~self.packRows(outputs)) | torch.zeros_like(words).index_add_(-1, outputs // 64, values)
+
+
+class PackedLine:
+    """
+    Represents a single row of a packed memory, for memory[i][j] indexing
+    """
+
+    def __init__(self, memory: PackedMemory, i: int):
+        self.memory = memory
+        self.i = i
+
+    def __getitem__(self, j):
+        return self.memory[self.i, j]
+
+    def __setitem__(self, j, value):
+        self.memory[self.i, j] = value
+
+
 class Simulator:
     """
     Simulates a single crossbar that supports stateful logic with partitions along both dimensions
     """
 
-    def __init__(self, row_partition_sizes: List[int], col_partition_sizes: List[int], device: torch.device):
+    def __init__(self, row_partition_sizes: List[int], col_partition_sizes: List[int], device: torch.device,
+                 backend: MemoryBackend = MemoryBackend.BOOL, validate: Validation = Validation.FULL,
+                 batch: Union[int, Sequence[int]] = None, dry_run: bool = False, technology: Technology = MAGIC, jit: bool = False,
+                 execution: Execution = Execution.CHECKED, validated: set = None):
         """
         Initializes the simulator according to the partition sizes, constructing a grid of partitions
         :param row_partition_sizes: A list containing the size of each partition in each row
         :param col_partition_sizes: A list containing the size of each partition in each column
         :param device: The device (e.g., CPU, GPU) to utilize
+        :param backend: The storage of the memory (a boolean tensor, or bit-packed words)
+        :param validate: When to check the parallel operations for partition collisions
+        :param batch: The number of independent crossbar copies that perform every operation together (the memory
+            then has a leading batch dimension, and the counters are those of a single copy), or the sizes of several
+            leading batch dimensions
+        :param dry_run: Whether to only count the latency and energy of the operations, without a memory to perform them on
+        :param technology: The delay and energy of the gates
+        :param jit: Whether compiled traces are replayed by the JIT-compiled kernel of Kernel.py (requires Numba,
+            the packed memory and the CPU)
+        :param execution: Whether the gates of a compiled trace check that their output cells are initialized (a
+            trace is replayed without the checks only once they are proven statically, see Preconditions.py)
+        :param validated: The programs (and partition layouts) that already completed a checked run, for
+            Validation.FIRST_RUN (a set shared by the simulators given it, e.g., along a sweep; by default, a set of
+            this simulator only)
         """
 
+        assert(not jit or backend == MemoryBackend.PACKED)
+
         # Initialize the memory
         self.r = sum(row_partition_sizes)
         self.c = sum(col_partition_sizes)
         self.device = device
-        self.memory = torch.zeros(self.r + 1, self.c + 1, dtype=torch.bool, device=device)
+        self.backend = backend
+        self.batch = batch
+        self.dry_run = dry_run
+        self.jit = jit
+        self.execution = execution
+        if dry_run:
+            self.memory = None
+        elif backend == MemoryBackend.PACKED:
+            self.memory = PackedMemory(self.r, self.c, device, batch)
+        else:
+            self.memory = torch.zeros(*batchShape(batch), self.r + 1, self.c + 1, dtype=torch.bool, device=device)
 
         # Initialize the partition address translation
         self.kr = len(row_partition_sizes)
         self.kc = len(col_partition_sizes)
-        self.row_partition_starts = [sum(row_partition_sizes[:i]) for i in range(self.kr)]
-        self.col_partition_starts = [sum(col_partition_sizes[:i]) for i in range(self.kc)]
-        self.row_addr_to_partition = sum([[i] * row_partition_sizes[i] for i in range(self.kr)], [])
-        self.col_addr_to_partition = sum([[i] * col_partition_sizes[i] for i in range(self.kc)], [])
+        self.row_partition_sizes = list(row_partition_sizes)
+        self.col_partition_sizes = list(col_partition_sizes)
+        self.row_partition_starts = [0] + list(accumulate(row_partition_sizes))[:-1]
+        self.col_partition_starts = [0] + list(accumulate(col_partition_sizes))[:-1]
+        self.row_addr_to_partition = [i for i in range(self.kr) for _ in range(row_partition_sizes[i])]
+        self.col_addr_to_partition = [i for i in range(self.kc) for _ in range(col_partition_sizes[i])]
+
+        # The interned masks, as device-resident index tensors, by contents and by the identity of the mask list
+        # (which is kept alive alongside)
+        self.mask_tensors = {}
+        self.mask_ids = {}
 
-        # Initialize the counters
+        # The interned addresses of the fused gate groups, as device-resident index tensors, by contents
+        self.address_tensors = {}
+
+        # Initialize the counters, in cycles and switchings, and in ns and fJ
+        self.technology = technology
         self.latency = 0
         self.energy = 0
+        self.time_ns = 0.0
+        self.energy_fJ = 0.0
 
         # For the register interpretation of the crossbar
         self.num_regs = self.c // self.kc
 
+        # The recorded parallel operations (None when not recording)
+        self.trace = None
+
+        # The profiler the performed operations are reported to (see Profiler.py), if any, and the other profilers
+        # that observe them alongside it (e.g., Keccak.StateChecker, Snapshot.SnapshotWriter)
+        self.profiler = None
+        self.observers = []
+
+        # The collision checking of the running program
+        self.validate = validate
+        self.validated_programs = validated if validated is not None else set()
+        self.program = None
+        self.checking = validate != Validation.OFF
+
     def relToAbsRow(self, partition, index):
         """
         Converts a row address from (partition, intra-partition index) to a global address
@@ -112,6 +464,223 @@ class Simulator:
         """
         return self.col_partition_starts[partition] + index
 
+    def unitTiles(self, memory: torch.Tensor, r_u: int, c_u: int):
+        """
+        Views the first r_u x c_u partitions of the memory as tiles
+        :param memory: the memory (as a boolean tensor)
+        :param r_u: the number of row partitions
+        :param c_u: the number of column partitions
+        :return: a (..., r_u, m, c_u, n) view, for partitions of m rows and n columns
+        """
+        m = self.row_partition_sizes[0]
+        n = self.col_partition_sizes[0]
+        assert(self.row_partition_sizes[:r_u] == [m] * r_u and self.col_partition_sizes[:c_u] == [n] * c_u)
+        return memory[..., :r_u * m, :c_u * n].unflatten(-2, (r_u, m)).unflatten(-1, (c_u, n))
+
+    def loadStates(self, states: torch.Tensor, column: int = 0, w: int = 64):
+        """
+        Stores a state in each of the first r_u x c_u partitions with a single strided assignment. The states are
+        lane-major (bit i of lane j at index i+j*w), and lane j is stored in rows 0..w-1 of intra-partition column column+j.
+        :param states: the states, a (..., r_u, c_u, lanes*w) tensor
+        :param column: the intra-partition column of the first lane
+        :param w: the lane size
+        """
+        r_u, c_u, bits = states.shape[-3:]
+        memory = self.memory if self.backend == MemoryBackend.BOOL else self.memory.unpack()
+        self.unitTiles(memory, r_u, c_u)[..., :w, :, column:column + bits // w] = states.unflatten(-1, (bits // w, w)).movedim(-1, -3)
+        if self.backend == MemoryBackend.PACKED:
+            self.memory.pack(memory)
+
+    def readStates(self, r_u: int = None, c_u: int = None, lanes: int = 25, column: int = 0, w: int = 64):
+        """
+        Reads the state of each of the first r_u x c_u partitions (see loadStates)
+        :param r_u: the number of row partitions (all but the last by default)
+        :param c_u: the number of column partitions (all but the last by default)
+        :param lanes: the number of lanes to read
+        :param column: the intra-partition column of the first lane
+        :param w: the lane size
+        :return: the states, a (..., r_u, c_u, lanes*w) tensor
+        """
+        r_u = r_u if r_u is not None else len(self.row_partition_sizes) - 1
+        c_u = c_u if c_u is not None else len(self.col_partition_sizes) - 1
+        memory = self.memory if self.backend == MemoryBackend.BOOL else self.memory.unpack()
+        tiles = self.unitTiles(memory, r_u, c_u)[..., :w, :, column:column + lanes]
+        return tiles.movedim(-3, -1).flatten(-2).clone()
+
+    def readDigests(self, digest: int, r_u: int = None, c_u: int = None, as_hex: bool = False, w: int = 64):
+        """
+        Reads the first digest bits of the state of each of the first r_u x c_u partitions, packed into bytes
+        (bit k of a byte is the state bit 8*byte+k)
+        :param digest: the number of bits (a multiple of 8)
+        :param r_u: the number of row partitions (all but the last by default)
+        :param c_u: the number of column partitions (all but the last by default)
+        :param as_hex: whether to return hex strings instead of bytes
+        :param w: the lane size
+        :return: a (..., r_u, c_u, digest/8) uint8 tensor, or a list of hex strings (in the order of the units in the tensor)
+        """
+        bits = self.readStates(r_u, c_u, lanes=(digest + w - 1) // w, w=w)[..., :digest]
+        out_in_bytes = (bits.unflatten(-1, (-1, 8)).to(torch.int64) << torch.arange(8, device=self.device)).sum(dim=-1).to(torch.uint8)
+        if as_hex:
+            return [bytes(it).hex() for it in out_in_bytes.reshape(-1, digest // 8).tolist()]
+        return out_in_bytes
+
+    def saveSnapshot(self, path: str, position: dict = None):
+        """
+        Writes the memory, counters and partition layout to a snapshot file (see SNAPSHOT_MAGIC). The cells are
+        bit-packed (whatever the backend) and written through a memory map.
+        :param path: the snapshot file
+        :param position: where the program is at (e.g., {'round': 3, 'step': 'Rho'}), stored as is
+        """
+
+        assert(not self.dry_run)
+        cells = self.memory if self.backend == MemoryBackend.BOOL else self.memory.unpack()
+
+        header = {'row_partition_sizes': self.row_partition_sizes, 'col_partition_sizes': self.col_partition_sizes,
+                  'batch': self.batch, 'shape': list(cells.shape),
+                  'technology': {'name': self.technology.name, 'delay': self.technology.delay,
+                                 'energy': self.technology.energy,
+                                 'gate_delays': {k.name: v for k, v in self.technology.gate_delays.items()},
+                                 'gate_energies': {k.name: v for k, v in self.technology.gate_energies.items()}},
+                  'counters': {'latency': self.latency, 'energy': self.energy, 'time_ns': self.time_ns,
+                               'energy_fJ': self.energy_fJ},
+                  'position': position}
+        header = json.dumps(header).encode()
+        offset = -(-(len(SNAPSHOT_MAGIC) + 8 + len(header)) // 64) * 64
+        packed = np.packbits(cells.cpu().numpy().reshape(-1), bitorder='little')
+
+        with open(path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC + len(header).to_bytes(8, 'little') + header)
+            f.truncate(offset + len(packed))
+        data = np.memmap(path, dtype=np.uint8, mode='r+', offset=offset, shape=packed.shape)
+        data[:] = packed
+        data.flush()
+
+    def loadSnapshot(self, path: str):
+        """
+        Restores the memory and counters from a snapshot file of the same partition layout (see saveSnapshot).
+        A snapshot of a single crossbar is broadcast to all the crossbars of a batch.
+        :param path: the snapshot file
+        :return: the position stored with the snapshot
+        """
+
+        assert(not self.dry_run)
+        header, data = readSnapshot(path)
+        assert(header['row_partition_sizes'] == self.row_partition_sizes and
+               header['col_partition_sizes'] == self.col_partition_sizes)
+
+        shape = tuple(header['shape'])
+        cells = np.unpackbits(data, count=int(np.prod(shape)), bitorder='little').reshape(shape)
+        cells = torch.from_numpy(cells.astype(bool)).to(self.device)
+        if self.backend == MemoryBackend.BOOL:
+            self.memory[...] = cells
+        else:
+            self.memory.pack(cells)
+
+        counters = header['counters']
+        self.latency, self.energy = counters['latency'], counters['energy']
+        self.time_ns, self.energy_fJ = counters['time_ns'], counters['energy_fJ']
+        return header['position']
+
+    @staticmethod
+    def fromSnapshot(path: str, device: torch.device, backend: MemoryBackend = MemoryBackend.BOOL,
+                     validate: Validation = Validation.FULL, batch: int = None):
+        """
+        Constructs a simulator from a snapshot file (see saveSnapshot), with its partition layout, technology, memory and
+        counters. Each call returns an independent copy, so a prepared state can be fanned out to many experiments.
+        :param path: the snapshot file
+        :param device: The device (e.g., CPU, GPU) to utilize
+        :param backend: The storage of the memory (a boolean tensor, or bit-packed words)
+        :param validate: When to check the parallel operations for partition collisions
+        :param batch: The number of crossbar copies (by default, that of the snapshot)
+        :return: the simulator, and the position stored with the snapshot
+        """
+
+        header, _ = readSnapshot(path)
+        technology = header['technology']
+        technology = Technology(technology['name'], technology['delay'], technology['energy'],
+                                {GateType[k]: v for k, v in technology['gate_delays'].items()},
+                                {GateType[k]: v for k, v in technology['gate_energies'].items()})
+
+        sim = Simulator(header['row_partition_sizes'], header['col_partition_sizes'], device, backend, validate,
+                        batch if batch is not None else header['batch'], technology=technology)
+        return sim, sim.loadSnapshot(path)
+
+    def tileGroups(self, row_groups: int, col_groups: int, shared_rows: int = 1, shared_cols: int = 1):
+        """
+        Splits the partitions into row_groups x col_groups groups of consecutive partitions. The last shared_rows row
+        partitions and shared_cols column partitions (e.g., constants) are shared by all the groups.
+        :param row_groups: the number of groups of row partitions
+        :param col_groups: the number of groups of column partitions
+        :param shared_rows: the number of shared row partitions
+        :param shared_cols: the number of shared column partitions
+        :return: a list of (row partitions, column partitions) per group, without the shared partitions
+        """
+        kr = len(self.row_partition_sizes) - shared_rows
+        kc = len(self.col_partition_sizes) - shared_cols
+        assert(0 < row_groups <= kr and 0 < col_groups <= kc)
+        return [(list(range(kr * i // row_groups, kr * (i + 1) // row_groups)),
+                 list(range(kc * j // col_groups, kc * (j + 1) // col_groups)))
+                for i in range(row_groups) for j in range(col_groups)]
+
+    def performSharded(self, program, row_groups: int, col_groups: int, shared_rows: int = 1, shared_cols: int = 1,
+                       processes: int = None):
+        """
+        Runs a program on groups of partitions that never exchange data (other than reading the shared partitions),
+        each in a worker process that simulates the group as a crossbar of its own over shared memory.
+        The groups run in parallel: the latency is that of the slowest group, and the energy is the sum of the groups.
+        Operations that are serialized across groups (e.g., one per partition) are charged once per group only.
+        :param program: a picklable function of a simulator, that runs the program on it
+        :param row_groups: the number of groups of row partitions (see tileGroups)
+        :param col_groups: the number of groups of column partitions (see tileGroups)
+        :param shared_rows: the number of (last) row partitions that every group holds
+        :param shared_cols: the number of (last) column partitions that every group holds
+        :param processes: the number of worker processes (default: the number of CPUs)
+        :return: the (latency, energy, time (ns), energy (fJ)) of each group
+        """
+
+        assert(not self.dry_run)
+
+        memory = self.memory if self.backend == MemoryBackend.BOOL else self.memory.unpack()
+        kr = len(self.row_partition_sizes)
+        kc = len(self.col_partition_sizes)
+
+        def addresses(starts, sizes, partitions):
+            return [a for p in partitions for a in range(starts[p], starts[p] + sizes[p])]
+
+        shards = []
+        for row_partitions, col_partitions in self.tileGroups(row_groups, col_groups, shared_rows, shared_cols):
+            row_partitions += list(range(kr - shared_rows, kr))
+            col_partitions += list(range(kc - shared_cols, kc))
+            rows = addresses(self.row_partition_starts, self.row_partition_sizes, row_partitions) + [self.r]
+            cols = addresses(self.col_partition_starts, self.col_partition_sizes, col_partitions) + [self.c]
+            rows = torch.tensor(rows, dtype=torch.long, device=self.device)
+            cols = torch.tensor(cols, dtype=torch.long, device=self.device)
+
+            cells = memory[..., rows[:, None], cols].share_memory_()
+            shards.append((rows, cols, cells, ([self.row_partition_sizes[p] for p in row_partitions],
+                                              [self.col_partition_sizes[p] for p in col_partitions])))
+
+        with mp.Pool(processes) as pool:
+            costs = pool.starmap(performShard, [(row_sizes, col_sizes, self.device, self.backend, self.validate,
+                                                 self.batch, self.technology, self.jit, self.execution,
+                                                 self.validated_programs, cells, program)
+                                                for _, _, cells, (row_sizes, col_sizes) in shards])
+
+        # Each group writes back its own partitions, and the first groups also write back the shared partitions
+        shared_row_start = self.row_partition_starts[kr - shared_rows] if shared_rows else self.r
+        shared_col_start = self.col_partition_starts[kc - shared_cols] if shared_cols else self.c
+        for g, (rows, cols, cells, _) in enumerate(shards):
+            i, j = divmod(g, col_groups)
+            row_keep = torch.ones_like(rows, dtype=torch.bool) if i == 0 else rows < shared_row_start
+            col_keep = torch.ones_like(cols, dtype=torch.bool) if j == 0 else cols < shared_col_start
+            memory[..., rows[row_keep][:, None], cols[col_keep]] = cells[..., row_keep, :][..., col_keep]
+        if self.backend == MemoryBackend.PACKED:
+            self.memory.pack(memory)
+
+        self.charge(max(cost[0] for cost in costs), sum(cost[1] for cost in costs),
+                    max(cost[2] for cost in costs), sum(cost[3] for cost in costs))
+        return costs
+
     def perform(self, parallelOp: ParallelOperation):
         """
         Performs the given parallel operation on the simulation crossbar
@@ -119,30 +688,120 @@ class Simulator:
         """
 
         # Verify they do not collide
+        if self.checking:
+            self.checkCollisions(parallelOp)
+
+        if self.trace is not None:
+            self.trace.append(parallelOp)
+
+        # Perform all the gates of each (gate type, mask) group at once
+        energy = 0
+        delay = 0
+        energy_fJ = 0
+        profilers = self.profilers()
+        for g, (gateType, gateDirection, inputs, outputs, mask) in enumerate(self.fuse(parallelOp)):
+            start = time.perf_counter() if profilers else None
+            if not self.dry_run:
+                mask = self.maskTensor(mask)
+                self.performGates(gateType, gateDirection, *self.addressTensors(inputs, outputs), mask)
+            gates_energy = self.gatesEnergy(gateType, gateDirection, len(outputs), mask)
+            energy += gates_energy
+            energy_fJ += gates_energy * self.technology.gateEnergy(gateType)
+
+            # The cycle lasts as long as its slowest gate
+            delay = max(delay, self.technology.gateDelay(gateType))
+
+            # The cycle is attributed to the first group
+            if profilers:
+                wall_time = time.perf_counter() - start
+                for profiler in profilers:
+                    profiler.report(gateType, int(g == 0), gates_energy, wall_time)
+
+        # Update latency and energy
+        self.charge(1, energy, delay, energy_fJ)
+
+    def profilers(self):
+        """
+        :return: the profiler (if any) and the observers, which are all reported the performed operations and steps
+        """
+        return [self.profiler] + self.observers if self.profiler is not None else self.observers
+
+    def charge(self, latency: int, energy: int, time_ns: float = None, energy_fJ: float = None):
+        """
+        Adds to the latency and energy counters
+        :param latency: the number of cycles
+        :param energy: the number of switchings
+        :param time_ns: the delay of the cycles (ns), by default a cycle of the technology each
+        :param energy_fJ: the energy of the switchings (fJ), by default a switching of the technology each
+        """
+        self.latency += latency
+        self.energy += energy
+        self.time_ns += time_ns if time_ns is not None else latency * self.technology.delay
+        self.energy_fJ += energy_fJ if energy_fJ is not None else energy * self.technology.energy
+
+    def checkCollisions(self, parallelOp: ParallelOperation):
+        """
+        Verifies that the operations of a parallel operation span disjoint ranges of partitions, by sorting the
+        partition span of each operation (translated from its precomputed address span) and comparing neighbours
+        :param parallelOp: the parallel operation to check
+        """
+
         translation = self.col_addr_to_partition if parallelOp.ops[0].gateDirection == GateDirection.IN_ROW else self.row_addr_to_partition
-        for op1 in parallelOp.ops:
-            for op2 in parallelOp.ops:
-                if op1 != op2:
-                    first_addrs = (min(op1.inputs + op1.outputs), max(op1.inputs + op1.outputs))
-                    second_addrs = (min(op2.inputs + op2.outputs), max(op2.inputs + op2.outputs))
-                    first_partitions = (translation[first_addrs[0]], translation[first_addrs[1]])
-                    second_partitions = (translation[second_addrs[0]], translation[second_addrs[1]])
-                    assert(not ((first_partitions[0] <= second_partitions[1]) and (first_partitions[1] >= second_partitions[0])))
+        spans = sorted((translation[op.span[0]], translation[op.span[1]]) for op in parallelOp.ops if op.span is not None)
+        for first, second in zip(spans, spans[1:]):
+            assert(first[1] < second[0])
+
+    def beginProgram(self, key):
+        """
+        Marks the start of a run of a program, so that Validation.FIRST_RUN checks only its first run
+        :param key: identifies the program (the partition layout is added to it)
+        """
+        self.program = (key, tuple(self.row_partition_starts), tuple(self.col_partition_starts), self.r, self.c)
+        self.checking = self.validate == Validation.FULL or \
+            (self.validate == Validation.FIRST_RUN and self.program not in self.validated_programs)
+
+    def endProgram(self):
+        """
+        Marks the successful end of the running program
+        """
+        if self.checking:
+            self.validated_programs.add(self.program)
+        self.program = None
+        self.checking = self.validate != Validation.OFF
 
+    def fuse(self, parallelOp: ParallelOperation):
+        """
+        Groups the operations of a parallel operation by gate type and mask, stacking their addresses
+        :param parallelOp: the parallel operation
+        :return: a list of (gateType, gateDirection, inputs, outputs, mask) groups, with the inputs of each gate as
+            a pair of addresses (NOT repeats its single input)
+        """
+
+        groups = {}
         for op in parallelOp.ops:
-            self.performOperation(op)
-            # Update energy
-            if op.gateType == GateType.INIT0 or GateType.INIT1:
-                if op.mask is None:
-                    self.energy += len(op.outputs) * (self.r if (op.gateDirection == GateDirection.IN_ROW) else self.c)
-                else:
-                    self.energy +=  len(op.outputs) * len(op.mask)
-            else:
-                if op.mask is None:
-                    self.energy += self.r if (op.gateDirection == GateDirection.IN_ROW) else self.c
-                else:
-                    self.energy += len(op.mask)
-        self.latency += 1
+            group = groups.get((op.gateType, id(op.mask)))
+            if group is None:
+                group = groups[(op.gateType, id(op.mask))] = (op.gateType, op.gateDirection, [], [], op.mask)
+            if op.inputs:
+                group[2].append([op.inputs[0], op.inputs[-1]])
+            group[3].extend(op.outputs)
+        return list(groups.values())
+
+    def gatesEnergy(self, gateType: GateType, gateDirection: GateDirection, num_outputs: int, mask=None):
+        """
+        Computes the number of switchings charged for gates of the same type and direction
+        :param gateType: the type of the gates (e.g., NOR)
+        :param gateDirection: the direction of the gates (e.g., IN_ROW)
+        :param num_outputs: the total number of output addresses of the gates
+        :param mask: the shared mask on the gates (all rows/columns when None)
+        :return: the number of switchings
+        """
+
+        # Each output is written once in every row/column of the mask
+        if mask is None:
+            return num_outputs * (self.r if (gateDirection == GateDirection.IN_ROW) else self.c)
+        else:
+            return num_outputs * len(mask)
 
     def performOperation(self, operation: Operation):
         """
@@ -150,65 +809,238 @@ class Simulator:
         :param operation: the operation to perform
         """
 
-        mask = operation.mask if operation.mask is not None else list(range(self.r if operation.gateDirection == GateDirection.IN_ROW else self.c))
+        self.performGates(operation.gateType, operation.gateDirection,
+            torch.tensor([[operation.inputs[0], operation.inputs[-1]]] if operation.inputs else [], dtype=torch.long, device=self.device).reshape(-1, 2),
+            torch.tensor(operation.outputs, dtype=torch.long, device=self.device),
+            self.maskTensor(operation.mask))
 
+    def maskTensor(self, mask):
+        """
+        Interns a mask as a device-resident index tensor, which is reused for the rest of the run (a mask list
+        must not be modified once used)
+        :param mask: the row/col addresses, a list (or a tensor, or None for all the rows/columns)
+        :return: the index tensor shared by all the masks with the same addresses (or the given tensor, or None)
+        """
+        if mask is None or isinstance(mask, torch.Tensor):
+            return mask
+        cached = self.mask_ids.get(id(mask))
+        if cached is None or cached[0] is not mask:
+            if len(self.mask_ids) >= 1024:
+                self.mask_ids.clear()
+            key = tuple(mask)
+            if key not in self.mask_tensors:
+                self.mask_tensors[key] = torch.tensor(key, dtype=torch.long, device=self.device)
+            cached = (mask, self.mask_tensors[key])
+            self.mask_ids[id(mask)] = cached
+        return cached[1]
 
-        if operation.gateType == GateType.NOT:
+    def addressTensors(self, inputs: list, outputs: list):
+        """
+        Interns the addresses of a fused group of gates (see fuse) as device-resident index tensors, which are reused
+        by the groups with the same addresses (e.g., in every round)
+        :param inputs: the input addresses, a pair per gate
+        :param outputs: the output addresses
+        :return: the input (one row of two per gate) and output index tensors shared by all the groups with the same
+            addresses
+        """
+        key = (tuple(chain.from_iterable(inputs)), tuple(outputs))
+        cached = self.address_tensors.get(key)
+        if cached is None:
+            if len(self.address_tensors) >= 65536:
+                self.address_tensors.clear()
+            cached = self.address_tensors[key] = (torch.tensor(key[0], dtype=torch.long, device=self.device).reshape(-1, 2),
+                                                  torch.tensor(key[1], dtype=torch.long, device=self.device))
+        return cached
 
-            if operation.gateDirection == GateDirection.IN_ROW:
-                assert((self.memory[mask, operation.outputs[0]] == True).all())
-                self.memory[mask, operation.outputs[0]] = torch.bitwise_and(self.memory[mask, operation.outputs[0]],
-                torch.bitwise_not(self.memory[mask, operation.inputs[0]]))
-            else:
-                assert((self.memory[operation.outputs[0], mask] == True).all())
-                self.memory[operation.outputs[0], mask] = torch.bitwise_and(self.memory[operation.outputs[0], mask],
-                torch.bitwise_not(self.memory[operation.inputs[0], mask]))
+    def activeMemories(self):
+        """
+        :return: the memories the operations are performed on (see MultiCrossbarSimulator.setActive)
+        """
+        return [self.memory]
 
-        elif operation.gateType == GateType.NOR:
+    def performGates(self, gateType: GateType, gateDirection: GateDirection, inputs: torch.LongTensor,
+                     outputs: torch.LongTensor, mask: torch.LongTensor = None, check: bool = True):
+        """
+        Performs several gates of the same type and direction as a single indexed tensor update
+        :param gateType: the type of the gates (e.g., NOR)
+        :param gateDirection: the direction of the gates (e.g., IN_ROW)
+        :param inputs: the absolute input addresses, one row of two per gate (NOT reads only the first)
+        :param outputs: the distinct absolute output addresses, one per gate (any number for INIT0/INIT1)
+        :param mask: the shared mask on the gates (all rows/columns when None)
+        :param check: whether to check that the output cells of the logic gates (other than NAND) are initialized to 1
+            (skipped only for the steps of a proven trace, see CompiledTrace.replay)
+        """
+
+        if self.backend == MemoryBackend.PACKED:
+            self.memory.performGates(gateType, gateDirection, inputs, outputs, mask, check)
+            return
 
-            if operation.gateDirection == GateDirection.IN_ROW:
-                assert((self.memory[mask, operation.outputs[0]] == True).all())
-                self.memory[mask, operation.outputs[0]] = torch.bitwise_and(self.memory[mask, operation.outputs[0]],
-                torch.bitwise_not(torch.bitwise_or(self.memory[mask, operation.inputs[0]], self.memory[mask, operation.inputs[1]])))
-            else:
-                assert((self.memory[operation.outputs[0], mask] == True).all())
-                self.memory[operation.outputs[0], mask] = torch.bitwise_and(self.memory[operation.outputs[0], mask],
-                torch.bitwise_not(torch.bitwise_or(self.memory[operation.inputs[0], mask], self.memory[operation.inputs[1], mask])))
+        if gateDirection == GateDirection.IN_ROW:
+            lines = mask[:, None] if mask is not None else slice(0, self.r)
+            index = lambda addrs: (..., lines, addrs)
+        else:
+            lines = mask[None, :] if mask is not None else slice(0, self.c)
+            index = lambda addrs: (..., addrs[:, None], lines)
 
-        elif operation.gateType == GateType.NAND:
+        if gateType == GateType.INIT0 or gateType == GateType.INIT1:
+            self.memory[index(outputs)] = (gateType == GateType.INIT1)
+            return
 
-            if operation.gateDirection == GateDirection.IN_ROW:
-                self.memory[mask, operation.outputs[0]] = torch.bitwise_and(self.memory[mask, operation.outputs[0]],
-                torch.bitwise_not(torch.bitwise_and(self.memory[mask, operation.inputs[0]], self.memory[mask, operation.inputs[1]])))
-            else:
-                self.memory[operation.outputs[0], mask] = torch.bitwise_and(self.memory[operation.outputs[0], mask],
-                torch.bitwise_not(torch.bitwise_and(self.memory[operation.inputs[0], mask], self.memory[operation.inputs[1], mask])))
+        a = self.memory[index(inputs[:, 0])]
+        b = self.memory[index(inputs[:, 1])]
+        current = self.memory[index(outputs)]
 
-        elif operation.gateType == GateType.OR:
+        if gateType == GateType.NOT:
+            result = torch.bitwise_not(a)
+        elif gateType == GateType.NOR:
+            result = torch.bitwise_not(torch.bitwise_or(a, b))
+        elif gateType == GateType.NAND:
+            result = torch.bitwise_not(torch.bitwise_and(a, b))
+        else:
+            result = torch.bitwise_or(a, b)
 
-            if operation.gateDirection == GateDirection.IN_ROW:
-                assert((self.memory[mask, operation.outputs[0]] == True).all())
-                self.memory[mask, operation.outputs[0]] = torch.bitwise_and(self.memory[mask, operation.outputs[0]],
-                torch.bitwise_or(self.memory[mask, operation.inputs[0]], self.memory[mask, operation.inputs[1]]))
-            else:
-                assert((self.memory[operation.outputs[0], mask] == True).all())
-                self.memory[operation.outputs[0], mask] = torch.bitwise_and(self.memory[operation.outputs[0], mask],
-                torch.bitwise_or(self.memory[operation.inputs[0], mask], self.memory[operation.inputs[1], mask]))
+        if check and gateType != GateType.NAND:
+            assert(current.all())
 
-        elif operation.gateType == GateType.INIT0:
+        self.memory[index(outputs)] = torch.bitwise_and(current, result)
 
-            for output in operation.outputs:
 
-                if operation.gateDirection == GateDirection.IN_ROW:
-                    self.memory[mask, output] = False
-                else:
-                    self.memory[output, mask] = False
+def performShard(row_partition_sizes: List[int], col_partition_sizes: List[int], device: torch.device,
+                 backend: MemoryBackend, validate: Validation, batch: Union[int, Sequence[int]], technology: Technology,
+                 jit: bool, execution: Execution, validated: set, cells: torch.Tensor, program):
+    """
+    Runs a program on a group of partitions simulated as a crossbar of its own (see Simulator.performSharded)
+    :param row_partition_sizes: the size of each row partition of the group
+    :param col_partition_sizes: the size of each column partition of the group
+    :param device: The device (e.g., CPU, GPU) to utilize
+    :param backend: The storage of the memory
+    :param validate: When to check the parallel operations for partition collisions
+    :param batch: The number of crossbar copies, if any
+    :param technology: The delay and energy of the gates
+    :param jit: Whether compiled traces are replayed by the JIT-compiled kernel
+    :param execution: Whether the gates of a compiled trace check that their output cells are initialized
+    :param validated: The programs that already completed a checked run (a copy of those of the caller)
+    :param cells: the memory of the group, in shared memory (updated in place)
+    :param program: a function of a simulator, that runs the program on it
+    :return: the (latency, energy, time (ns), energy (fJ)) of the group
+    """
+    sim = Simulator(row_partition_sizes, col_partition_sizes, device, backend, validate, batch, technology=technology,
+                    jit=jit, execution=execution, validated=validated)
+    if backend == MemoryBackend.PACKED:
+        sim.memory.pack(cells)
+    else:
+        sim.memory = cells
+    program(sim)
+    if backend == MemoryBackend.PACKED:
+        cells[...] = sim.memory.unpack()
+    return sim.latency, sim.energy, sim.time_ns, sim.energy_fJ
 
-        elif operation.gateType == GateType.INIT1:
 
-            for output in operation.outputs:
+class MultiCrossbarSimulator(Simulator):
+    """
+    Simulates several crossbars that perform the same operations together, each with its own memory and counters
+    """
 
-                if operation.gateDirection == GateDirection.IN_ROW:
-                    self.memory[mask, output] = True
-                else:
-                    self.memory[output, mask] = True
+    def __init__(self, row_partition_sizes: List[int], col_partition_sizes: List[int], crossbars: int, device: torch.device,
+                 backend: MemoryBackend = MemoryBackend.BOOL, validate: Validation = Validation.FULL, batch: int = None,
+                 dry_run: bool = False, technology: Technology = MAGIC, jit: bool = False,
+                 execution: Execution = Execution.CHECKED, validated: set = None):
+        """
+        Initializes the simulator according to the partition sizes, constructing a grid of partitions in each crossbar
+        :param row_partition_sizes: A list containing the size of each partition in each row
+        :param col_partition_sizes: A list containing the size of each partition in each column
+        :param crossbars: The number of crossbars (the leading dimension of the memory)
+        :param device: The device (e.g., CPU, GPU) to utilize
+        :param backend: The storage of the memory (a boolean tensor, or bit-packed words)
+        :param validate: When to check the parallel operations for partition collisions
+        :param batch: The number of copies of each crossbar (a second batch dimension of the memory), if any
+        :param dry_run: Whether to only count the latency and energy of the operations, without a memory to perform them on
+        :param technology: The delay and energy of the gates
+        :param jit: Whether compiled traces are replayed by the JIT-compiled kernel of Kernel.py
+        :param execution: Whether the gates of a compiled trace check that their output cells are initialized
+        :param validated: The programs (and partition layouts) that already completed a checked run
+        """
+
+        super().__init__(row_partition_sizes, col_partition_sizes, device, backend, validate,
+                         batch=(crossbars,) if batch is None else (crossbars, batch), dry_run=dry_run,
+                         technology=technology, jit=jit, execution=execution, validated=validated)
+
+        self.crossbars = crossbars
+
+        # The crossbars that perform and are charged for the operations (the others are idle, and keep their contents),
+        # and the memory of each active crossbar while some are idle (see setActive)
+        self.active = torch.ones(crossbars, dtype=torch.bool, device=device)
+        self.views = None
+
+        # The counters of each crossbar, in cycles and switchings, and in ns and fJ
+        self.latencies = torch.zeros(crossbars, dtype=torch.int64, device=device)
+        self.energies = torch.zeros(crossbars, dtype=torch.int64, device=device)
+        self.times_ns = torch.zeros(crossbars, dtype=torch.float64, device=device)
+        self.energies_fJ = torch.zeros(crossbars, dtype=torch.float64, device=device)
+
+    def charge(self, latency: int, energy: int, time_ns: float = None, energy_fJ: float = None):
+        """
+        Adds to the latency and energy counters, and to the counters of each active crossbar
+        :param latency: the number of cycles
+        :param energy: the number of switchings (of a single crossbar)
+        :param time_ns: the delay of the cycles (ns)
+        :param energy_fJ: the energy of the switchings (fJ, of a single crossbar)
+        """
+        previous_ns, previous_fJ = self.time_ns, self.energy_fJ
+        super().charge(latency, energy, time_ns, energy_fJ)
+        self.latencies += latency * self.active
+        self.energies += energy * self.active
+        self.times_ns += (self.time_ns - previous_ns) * self.active
+        self.energies_fJ += (self.energy_fJ - previous_fJ) * self.active
+
+    def setActive(self, crossbars: List[int] = None):
+        """
+        Selects the crossbars that perform and are charged for the following operations, e.g., to idle the crossbars
+        whose messages are finished while the others continue. The memory and counters of the idle crossbars are kept.
+        :param crossbars: the indices of the active crossbars (all the crossbars when None)
+        """
+        self.active.fill_(crossbars is None)
+        if crossbars is not None:
+            self.active[crossbars] = True
+
+        if self.active.all() or self.dry_run:
+            self.views = None
+        else:
+            indices = self.active.nonzero().flatten().tolist()
+            self.views = [self.memory[k] if self.backend == MemoryBackend.BOOL else self.memory.crossbar(k) for k in indices]
+
+    def activeMemories(self):
+        """
+        :return: the memory of each active crossbar, or the whole memory when all the crossbars are active
+        """
+        return self.views if self.views is not None else [self.memory]
+
+    def performGates(self, gateType: GateType, gateDirection: GateDirection, inputs: torch.LongTensor,
+                     outputs: torch.LongTensor, mask: torch.LongTensor = None, check: bool = True):
+        """
+        Performs several gates of the same type and direction on the active crossbars (see Simulator.performGates)
+        """
+        if self.views is None:
+            super().performGates(gateType, gateDirection, inputs, outputs, mask, check)
+            return
+
+        memory = self.memory
+        try:
+            for view in self.views:
+                self.memory = view
+                super().performGates(gateType, gateDirection, inputs, outputs, mask, check)
+        finally:
+            self.memory = memory
+
+    def loadStates(self, states: torch.Tensor, column: int = 0, w: int = 64):
+        """
+        Stores the states of the active crossbars (see Simulator.loadStates)
+        :param states: the states, a (crossbars, [batch,] r_u, c_u, lanes*w) tensor
+        :param column: the intra-partition column of the first lane
+        :param w: the lane size
+        """
+        if self.views is not None:
+            r_u, c_u, bits = states.shape[-3:]
+            kept = self.readStates(r_u, c_u, bits // w, column, w)
+            states = torch.where(self.active.reshape(-1, *[1] * (kept.dim() - 1)), states, kept)
+        super().loadStates(states, column, w)